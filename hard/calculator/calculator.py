@@ -1,23 +1,297 @@
-import itertools
-from collections import deque
-from typing import Deque, Union
+import argparse
+import csv
+import decimal
+import math
+import operator
+import re
+import sys
+import time
+from collections import ChainMap, OrderedDict
+from fractions import Fraction
+from typing import Iterable, List, Mapping, NamedTuple, TextIO, Tuple, Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# The opcodes of a compiled expression. A compiled expression, or Program, is a tuple of the instructions of the
+# expression in postfix notation, each of which is a tuple of an opcode and its argument, along with a tuple of the
+# names of the variables it uses. PUSH pushes its argument onto the stack, LOAD pushes the value of the variable whose
+# name is at the index (slot) given by its argument, NEG negates the value on top of the stack, and the remaining
+# opcodes pop two values from the stack and push the result of the corresponding operator.
+PUSH, LOAD, ADD, SUB, MUL, DIV, POW, NEG = range(8)
+OPCODES = {'+': ADD, '-': SUB, '*': MUL, '/': DIV, '^': POW}
+
+# The operators whose results can overflow the fixed-size elements of NumPy arrays.
+WRAPPING_OPERATORS = {ADD: operator.add, SUB: operator.sub, MUL: operator.mul, POW: operator.pow}
+
+Program = Tuple[Tuple[Tuple[int, Union[int, None]], ...], Tuple[str, ...]]
+
+# The kinds of tokens that expressions are made up of.
+NUMBER = 'number'
+IDENTIFIER = 'identifier'
+OPERATOR = 'operator'
+UNARY = 'unary'
+LPAREN = 'lparen'
+RPAREN = 'rparen'
+EQUALS = 'equals'
+
+# The precedence of each operator. Operators of equal precedence are evaluated from left to right. A unary sign has the
+# precedence of addition and subtraction, so that '-a * b' is evaluated as '0 - a * b'.
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, '^': 3}
+
+# Matches a single token, and any whitespace before it. Runs of the same sign (even if separated by whitespace) are
+# matched as one operator, and any character that can't start a token is matched on its own so that it can be reported.
+TOKEN_PATTERN = re.compile(r'\s*(?:(?P<word>[A-Za-z0-9]+)|(?P<operator>\+(?:\s*\+)*|-(?:\s*-)*|[*/^])|(?P<paren>[()])|'
+                           r'(?P<equals>=)|(?P<invalid>\S))')
+
+
+# The text of the help page, printed by the '/help' command.
+HELP = (' Smart Calculator Help Page: \n'
+        '-----------------------------\n'
+        'Supported Expressions:       \n'
+        '> Assignment/Declaration     \n'
+        ' -> n = 3, m = n, etc.       \n'
+        '> Formulas (reactive mode)   \n'
+        ' -> total = price * qty      \n'
+        '> Arithmetic                 \n'
+        ' -> +, -, *, /, ^, (...)     \n'
+        '> Print Variable             \n'
+        ' -> variable_name            \n'
+        '-----------------------------\n'
+        'Supported commands:          \n'
+        ' -> /help - Print this help  \n'
+        '            page.            \n'
+        ' -> /load <file.csv> - Bind  \n'
+        '            variables to the \n'
+        '            columns of a CSV \n'
+        '            file.            \n'
+        ' -> /exit - Exit the program.\n')
+
+
+# A column of values bound to a variable, used in place of a NumPy array when NumPy is not installed. The arithmetic
+# operators are applied element-wise, with plain numbers applying to every element, so that compiled expressions can be
+# evaluated over whole Columns in one pass.
+class Column:
+    def __init__(self, values: Iterable[int]):
+        self.values = list(values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __str__(self) -> str:
+        return format_value(self)
+
+    # Applies the specified operator to each element of the Column and the corresponding element of the other Column,
+    # or the other number, and returns a Column of the results. Operands are swapped if reflected is True.
+    def apply(self, other, op, reflected=False) -> 'Column':
+        if isinstance(other, Column):
+            if len(other) != len(self):
+                raise ValueError('Columns have different lengths')
+            pairs = zip(self.values, other.values)
+        else:
+            pairs = ((v, other) for v in self.values)
+        if reflected:
+            return Column(op(b, a) for a, b in pairs)
+        return Column(op(a, b) for a, b in pairs)
 
+    def __add__(self, other):
+        return self.apply(other, operator.add)
+
+    def __radd__(self, other):
+        return self.apply(other, operator.add, True)
+
+    def __sub__(self, other):
+        return self.apply(other, operator.sub)
+
+    def __rsub__(self, other):
+        return self.apply(other, operator.sub, True)
+
+    def __mul__(self, other):
+        return self.apply(other, operator.mul)
+
+    def __rmul__(self, other):
+        return self.apply(other, operator.mul, True)
+
+    def __floordiv__(self, other):
+        return self.apply(other, operator.floordiv)
+
+    def __rfloordiv__(self, other):
+        return self.apply(other, operator.floordiv, True)
+
+    def __truediv__(self, other):
+        return self.apply(other, operator.truediv)
+
+    def __rtruediv__(self, other):
+        return self.apply(other, operator.truediv, True)
+
+    def __pow__(self, other):
+        return self.apply(other, operator.pow)
+
+    def __rpow__(self, other):
+        return self.apply(other, operator.pow, True)
+
+    def __mod__(self, other):
+        return self.apply(other, operator.mod)
+
+    def __neg__(self):
+        return Column(-v for v in self.values)
+
+
+# The number of digits above which Python refuses to convert integers to strings, or 0 if there is no such limit.
+STR_DIGITS = sys.get_int_max_str_digits() if hasattr(sys, 'get_int_max_str_digits') else 0
+
+
+# Returns an array of the specified values: a NumPy array of 64-bit integers if NumPy is installed, or a Column if not.
+def make_array(values: Iterable[int]):
+    if numpy is not None:
+        return numpy.array(list(values), dtype=numpy.int64)
+    return Column(values)
+
+
+# Returns whether the specified value is an array (a Column or a NumPy array) rather than a single number.
+def is_array(value) -> bool:
+    return isinstance(value, Column) or (numpy is not None and isinstance(value, numpy.ndarray))
+
+
+# Returns whether the specified value is a NumPy array.
+def is_numpy(value) -> bool:
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+# Returns a Column of the results of the specified function applied to each pair of elements of the specified operands,
+# at least one of which is a Column, with plain numbers paired with every element.
+def elementwise(a, b, func) -> 'Column':
+    if isinstance(a, Column):
+        return a.apply(b, func)
+    return b.apply(a, func, True)
 
-class Parser:
-    # A special terminating character, used to mark the end of the symbols deque.
-    term = '%endl%'
 
-    # The various valid letters and operators that are able to be used for variable names and calculations respectively.
-    valid_letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+# Returns the text of the specified result. Arrays are written out in full, however long they are, as their elements in
+# square brackets.
+def format_value(value) -> str:
+    if isinstance(value, Column):
+        return '[' + ' '.join(map(str, value.values)) + ']'
+    elif numpy is not None and isinstance(value, numpy.ndarray):
+        return '[' + ' '.join(map(str, value.tolist())) + ']'
+    return str(value)
+
+
+# Returns the base-10 logarithm of the size of the specified integer, or of the larger of the numerator and denominator
+# of the specified Fraction, or 0 for 0. A number has one more digit than this, rounded down.
+def magnitude(value) -> float:
+    if isinstance(value, Fraction):
+        return max(magnitude(value.numerator), magnitude(value.denominator))
+    value = abs(int(value))
+    return math.log10(value) if value > 0 else 0.0
+
+
+# Returns the number of decimal digits of the specified integer, or of the larger of the numerator and denominator of
+# the specified Fraction.
+def count_digits(value) -> int:
+    return math.floor(magnitude(value)) + 1
+
+
+# Returns the element of the specified Column with the most digits, or the specified value itself if it isn't a Column.
+def largest(value):
+    if isinstance(value, Column):
+        return max(value.values, key=magnitude, default=0)
+    return value
+
+
+# Returns whether the specified value, which may be a number or an array, is or contains zero.
+def has_zero(value) -> bool:
+    if isinstance(value, Column):
+        return 0 in value.values
+    elif numpy is not None and isinstance(value, numpy.ndarray):
+        return bool((value == 0).any())
+    return value == 0
+
+
+# A single token of an expression: its kind, its text and the index in the expression at which it starts.
+class Token(NamedTuple):
+    kind: str
+    text: str
+    pos: int
+
+
+# Returns a SyntaxError with the specified message which points at the specified position in the specified expression.
+def syntax_error(message: str, expression: str, pos: int) -> SyntaxError:
+    return SyntaxError(message, (None, 1, pos + 1, expression))
+
+
+# Splits the specified expression into a list of tokens in a single pass. Runs of '+' signs are collapsed into a single
+# '+', and runs of '-' signs into a '-' if there's an odd number of them or a '+' otherwise.
+def tokenize(expression: str) -> List[Token]:
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(expression):
+        kind = match.lastgroup
+        text = match.group(kind)
+        pos = match.start(kind)
+
+        if kind == 'word':
+            # Words are either numbers or variable identifiers, which may only consist of letters.
+            if text.isdigit():
+                tokens.append(Token(NUMBER, text, pos))
+            elif text.isalpha():
+                tokens.append(Token(IDENTIFIER, text, pos))
+            else:
+                raise NameError('Invalid identifier')
+        elif kind == 'operator':
+            if text[0] == '-':
+                text = '-' if text.count('-') % 2 == 1 else '+'
+            tokens.append(Token(OPERATOR, text[0], pos))
+        elif kind == 'paren':
+            tokens.append(Token(LPAREN if text == '(' else RPAREN, text, pos))
+        elif kind == 'equals':
+            tokens.append(Token(EQUALS, text, pos))
+        else:
+            raise syntax_error('Invalid expression', expression, pos)
+    return tokens
+
+
+class Parser:
+    # The various valid operators that are able to be used for calculations.
     valid_operators = '+-*/^'
 
-    def __init__(self):
-        # Create an empty deque to store expressions in.
-        self.symbols = deque()
+    # The number of compiled expressions to keep, so that expressions that are evaluated repeatedly are only compiled
+    # once.
+    cache_size = 256
+
+    # The numeric engines that calculations can be carried out with: exact integers (with floor division), exact
+    # fractions, or decimals with a fixed number of significant digits.
+    engines = ('int', 'fraction', 'decimal')
+
+    # Parsers calculate with the specified engine, and decimals with the specified precision. Results of exact engines
+    # which would have more than the specified number of digits are refused before they are calculated, as they would
+    # stall the Parser. If a modulus is specified, integer results are instead reduced modulo it after every operation,
+    # so they never grow that large. In reactive mode, variables can be assigned formulas, which are recalculated
+    # whenever a variable they depend on changes.
+    def __init__(self, engine='int', precision=28, max_digits=4300, modulus=None, reactive=False):
+        if engine not in self.engines:
+            raise ValueError('Unknown engine')
+        if modulus is not None and (engine != 'int' or modulus < 1):
+            raise ValueError('A modulus can only be used with the int engine and must be positive')
+
+        self.engine = engine
+        self.context = decimal.Context(prec=precision)
+        self.max_digits = max_digits
+        self.modulus = modulus
+        self.reactive = reactive
 
         # Store the values of user-specified variables in a dictionary.
         self.variables = {}
 
+        # Store the compiled formulas of variables assigned formulas in reactive mode, and, for each variable, the names
+        # of the variables whose formulas use it.
+        self.formulas = {}
+        self.dependents = {}
+
+        # Store compiled expressions by their text, least recently used first.
+        self.programs = OrderedDict()
+
     def command(self, cmd: str):
         # Ignore empty lines.
         if len(cmd) == 0:
@@ -26,311 +300,604 @@ class Parser:
         # If the specified string starts with a '/', process it as a command. Otherwise, parse it as an expression.
         if cmd[0] == '/':
             if cmd == '/help':
-                print(' Smart Calculator Help Page: ')
-                print('-----------------------------')
-                print('Supported Expressions:       ')
-                print('> Assignment/Declaration     ')
-                print(' -> n = 3, m = n, etc.       ')
-                print('> Arithmetic                 ')
-                print(' -> +, -, *, /, ^, (...)     ')
-                print('> Print Variable             ')
-                print(' -> variable_name            ')
-                print('-----------------------------')
-                print('Supported commands:          ')
-                print(' -> /help - Print this help  ')
-                print('            page.            ')
-                print(' -> /exit - Exit the program.')
+                print(HELP, end='')
             elif cmd == '/exit':
                 print('Bye!')
                 exit()
+            elif cmd.startswith('/load '):
+                try:
+                    print('Loaded', ', '.join(self.load_csv(cmd[len('/load '):].strip())))
+                except (OSError, ValueError, NameError) as e:
+                    print(e)
             else:
                 print('Unknown command')
         else:
             self.parse(cmd)
 
+    # Runs the specified line and prints its result, if any, or a message describing why it is invalid.
     def parse(self, expression: str):
-        # Split the current expression character-wise, ignoring whitespace, and store it in a deque attribute.
-        self.symbols = deque(filter(lambda c: c != ' ', expression))
-
-        # Append the special Parser terminating string.
-        self.symbols.append(Parser.term)
+        try:
+            result = self.run(expression)
+        except SyntaxError as e:
+            print(e.msg)
+        except (ValueError, NameError, ArithmeticError) as e:
+            print(e)
+        except Exception as e:
+            # Any other error is a calculation that can't be carried out, which mustn't end the program.
+            print('Invalid expression: {}'.format(e))
+        else:
+            if result is not None:
+                print(format_value(result))
 
+    # Runs the specified line, which is either an assignment, an expression or a lone identifier, and returns the value
+    # of the expression or variable, or None for an assignment. Raises a ValueError, NameError, SyntaxError or
+    # ArithmeticError with a message for the user if the line is invalid or can't be evaluated.
+    def run(self, expression: str):
         # If the specified expression contains an equal sign, attempt to parse it as an assignment.
         if '=' in expression:
-            try:
-                self.parse_assignment()
-            except ValueError as e:
-                print(e)
-            except NameError as e:
-                print(e)
-            except SyntaxError as e:
-                print(e)
-            finally:
-                return
+            self.parse_assignment(expression)
+            return None
 
-        # If the specified expression contains any of the valid operators, attempt to parse it as an expression.
-        if any([o in self.symbols for o in Parser.valid_operators]):
-            # Parse and evaluate the expression.
+        # If the specified expression contains any of the valid operators, attempt to compile and evaluate it as an
+        # expression. Any kind of syntax error is reported as an invalid expression.
+        if any([o in expression for o in Parser.valid_operators]):
             try:
-                self.parse_expression()
-                print(self.evaluate())
-            except SyntaxError:
-                print('Invalid expression')
-            return
+                program = self.compile(expression)
+            except SyntaxError as e:
+                raise SyntaxError('Invalid expression', (None, 1, e.offset, expression))
+            return self.evaluate(program)
 
         # Otherwise, attempt to parse the expression as a lone identifier of which to print the value.
+        var_id = self.parse_identifier(expression)
+        if var_id not in self.variables.keys():
+            raise ValueError('Unknown variable')
+        return self.variables[var_id]
+
+    # Runs each of the specified lines in turn, writing results to the specified output stream in large buffered chunks
+    # and reporting invalid lines, along with their line numbers, to the specified error stream without stopping. Stops
+    # early at a '/exit' command. Returns a mapping of the number of lines run, the number of errors and the time taken
+    # in seconds.
+    def run_batch(self, lines: Iterable[str], out: TextIO, errors: TextIO) -> Mapping[str, float]:
+        buffer = []
+        n_lines = 0
+        n_errors = 0
+        start = time.perf_counter()
         try:
-            var_id = self.parse_identifier(0, len(self.symbols) - 1)
-        except NameError as e:
-            print(e)
+            for number, line in enumerate(lines, 1):
+                line = line.rstrip('\r\n')
+                n_lines += 1
+                if len(line) == 0:
+                    continue
+
+                if line[0] == '/':
+                    if line == '/exit':
+                        break
+                    elif line == '/help':
+                        buffer.append(HELP)
+                    elif line.startswith('/load '):
+                        try:
+                            self.load_csv(line[len('/load '):].strip())
+                        except (OSError, ValueError, NameError) as e:
+                            n_errors += 1
+                            errors.write('line {}: {}\n'.format(number, e))
+                    else:
+                        n_errors += 1
+                        errors.write('line {}: Unknown command\n'.format(number))
+                    continue
+
+                # Results are formatted here, so that a result that can't be formatted is reported like any other error.
+                try:
+                    result = self.run(line)
+                    if result is not None:
+                        buffer.append(format_value(result) + '\n')
+                except SyntaxError as e:
+                    n_errors += 1
+                    errors.write('line {}, column {}: {}\n'.format(number, e.offset, e.msg))
+                except (ValueError, NameError, ArithmeticError) as e:
+                    n_errors += 1
+                    errors.write('line {}: {}\n'.format(number, e))
+                except Exception as e:
+                    n_errors += 1
+                    errors.write('line {}: Invalid expression: {}\n'.format(number, e))
+
+                # Write the results out in chunks, rather than one line at a time.
+                if len(buffer) >= 4096:
+                    out.writelines(buffer)
+                    buffer.clear()
+        finally:
+            # Write out the results so far even if the run is interrupted.
+            out.writelines(buffer)
+            out.flush()
+
+        return {'lines': n_lines, 'errors': n_errors, 'seconds': time.perf_counter() - start}
+
+    # Binds the variable with the specified name to an array of the specified values, so that expressions using it are
+    # evaluated for every value at once. The fraction and decimal engines bind Columns of their own numbers, so that
+    # arrays are calculated with, and divided like, single numbers.
+    def bind(self, name: str, values: Iterable[int]):
+        if self.engine == 'int':
+            array = make_array(values)
         else:
-            if var_id not in self.variables.keys():
-                print('Unknown variable')
-            else:
-                print(self.variables[var_id])
-
-    def parse_expression(self):
-        # Parse symbols and rotate the deque until its first element is the special terminating string.
-        while self.symbols[0] != self.term:
-            if self.symbols[0] in '()':
-                # If the current symbol is a left or right parenthesis, skip over it.
-                pass
-            elif self.symbols[0] in self.valid_operators:
-                # Handle the parsing of the operators in the list of valid operators.
-                self.parse_operator()
-            elif self.symbols[0].isdigit():
-                # Handle the parsing of a number.
-                self.parse_digit()
-            elif self.symbols[0] in self.valid_letters:
-                # Handle the parsing of a variable identifier. Count the number of symbols until the next operator.
-                length = 0
-                while self.symbols[0 + length] not in self.valid_operators and self.symbols[0 + length] != self.term:
-                    length += 1
-
-                # Check if the symbols from the current index up to the next operator form a valid identifier.
-                var_id = self.parse_identifier(0, length)
-                if var_id not in self.variables.keys():
-                    raise ValueError('Unknown variable')
-                else:
-                    # Remove the range of characters from the deque, then append the variable identifier to its front.
-                    for i in range(length):
-                        self.symbols.popleft()
-                    self.symbols.appendleft(var_id)
-            else:
-                # The expression entered was invalid.
-                raise ValueError('Invalid expression')
-
-            # Rotate the deque left, past the current element
-            self.symbols.rotate(-1)
-
-    def parse_operator(self):
-        if self.symbols[0] == '+':
-            # If the current symbol is a plus sign, remove all consecutive occurrences of it and add one back to the
-            # deque.
-            while self.symbols[0] == '+':
-                self.symbols.popleft()
-            self.symbols.appendleft('+')
-        elif self.symbols[0] == '-':
-            # If the current symbol is a minus sign, remove all consecutive occurrences of it and add the cumulative
-            # sign back to the deque.
-            count = 0
-            while self.symbols[0] == '-':
-                self.symbols.popleft()
-                count += 1
-            if count % 2 == 0:
-                self.symbols.appendleft('+')
-            else:
-                self.symbols.appendleft('-')
-
-        # If there are any operators directly following the current one, the syntax is invalid.
-        if self.symbols[1] in self.valid_operators:
-            raise SyntaxError('Invalid expression')
-
-    def parse_digit(self):
-        # Store a list of all consecutive digits following the current element and iterate until a non-digit is found.
-        digits = []
-        while self.symbols[0].isdigit():
-            # Append the current element to the list of digits.
-            digits.append(self.symbols[0])
-
-            # Remove the left-most element from the deque.
-            self.symbols.popleft()
-
-        # Join the digits into one string and append it to the start of the deque.
-        self.symbols.appendleft(''.join(digits))
-
-    def parse_assignment(self):
+            array = Column(self.number(v) for v in values)
+        self.assign(self.parse_identifier(name), array)
+
+    # Binds a variable to each column of the CSV file at the specified path, named by the column's header, and returns
+    # the names of the variables.
+    def load_csv(self, path: str) -> List[str]:
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            names = [self.parse_identifier(name) for name in next(reader, [])]
+            columns = [[] for _ in names]
+            for row in reader:
+                if len(row) != len(names):
+                    raise ValueError('Invalid row {} in {}'.format(reader.line_num, path))
+                for column, value in zip(columns, row):
+                    column.append(int(value))
+
+        for name, column in zip(names, columns):
+            self.bind(name, column)
+        return names
+
+    def parse_assignment(self, expression: str):
         # Ensure that there is exactly one equal sign present in the expression.
-        if self.symbols.count('=') > 1:
-            raise SyntaxError('Invalid assignment')
+        if expression.count('=') > 1:
+            raise syntax_error('Invalid assignment', expression, expression.index('=', expression.index('=') + 1))
 
         # Parse the identifier of the variable being assigned to.
-        eq = self.symbols.index('=')
-        dest_var = self.parse_identifier(0, eq)
+        eq = expression.index('=')
+        dest_var = self.parse_identifier(expression[:eq])
 
-        # Try to parse another variable identifier following the equals sign.
+        # The value being assigned must be either another variable or an integer, optionally preceded by a sign.
         try:
-            src_var = self.parse_identifier(eq + 1, len(self.symbols) - 1)
-        except NameError:
-            # Check for an integer value. If this conversion raises an exception, the assignment is invalid.
-            try:
-                value = int(''.join(itertools.islice(self.symbols, eq + 1, len(self.symbols) - 1)))
-            except ValueError:
-                raise SyntaxError('Invalid assignment')
-            else:
-                # Assign the integer value to the variable.
-                self.variables[dest_var] = value
-        else:
-            # If no error occurred, check that the second variable exists in the variables dictionary.
-            if src_var not in self.variables.keys():
-                raise ValueError('Unknown variable')
+            tokens = tokenize(expression[eq + 1:])
+        except (SyntaxError, NameError):
+            raise syntax_error('Invalid assignment', expression, eq + 1)
 
-            # Assign the value of the second variable to that of the first.
-            self.variables[dest_var] = self.variables[src_var]
-
-    def parse_identifier(self, start: int, stop: int) -> str:
-        # The variable is not being assigned a value.
-        identifier = ''.join(itertools.islice(self.symbols, start, stop))
+        if len(tokens) == 1 and tokens[0].kind == IDENTIFIER:
+            # Check that the second variable exists in the variables dictionary.
+            if tokens[0].text not in self.variables.keys():
+                raise ValueError('Unknown variable')
 
-        # Ensure that all of the characters in the identifier are valid.
-        for c in identifier:
-            if c not in Parser.valid_letters:
-                raise NameError('Invalid identifier')
+            # Assign the value of the second variable to that of the first. In reactive mode, the first variable
+            # instead follows the second one as a formula.
+            if self.reactive:
+                self.assign(dest_var, formula=self.compile(tokens[0].text))
+            else:
+                self.assign(dest_var, self.variables[tokens[0].text])
+        elif len(tokens) == 1 and tokens[0].kind == NUMBER:
+            self.assign(dest_var, int(tokens[0].text))
+        elif len(tokens) == 2 and tokens[0].kind == OPERATOR and tokens[0].text in '+-' and tokens[1].kind == NUMBER:
+            self.assign(dest_var, int(tokens[0].text + tokens[1].text))
+        elif self.reactive:
+            # In reactive mode, any other expression is assigned as a formula.
+            try:
+                program = self.compile(expression[eq + 1:])
+            except SyntaxError as e:
+                raise syntax_error('Invalid assignment', expression, eq + e.offset)
+            self.assign(dest_var, formula=program)
+        else:
+            raise syntax_error('Invalid assignment', expression, eq + 1)
+
+    # Assigns either the specified value or the specified compiled formula to the variable with the specified name, then
+    # recalculates the formulas of the variables that depend on it, in an order in which every formula is recalculated
+    # after the formulas it uses. If any of the formulas can't be calculated, or the formula would make a variable
+    # depend on itself, an error is raised and no variable is changed.
+    def assign(self, name: str, value=None, formula: Program = None):
+        if formula is not None:
+            # Check that the formula only uses existing variables, none of which depends on the variable being assigned.
+            downstream = self.downstream(name)
+            for used in formula[1]:
+                if used not in self.variables.keys():
+                    raise ValueError('Unknown variable')
+                if used in downstream:
+                    raise ValueError('Circular reference')
+
+        # Calculate the new values of the variable and its dependents without changing any variables, so that an error
+        # leaves every variable as it was.
+        changed = {}
+        values = ChainMap(changed, self.variables)
+        changed[name] = value if formula is None else self.evaluate(formula, values)
+        dependents = self.ordered_dependents(name)
+        for dependent in dependents:
+            changed[dependent] = self.evaluate(self.formulas[dependent], values)
+
+        # Replace the variable's formula, if any, along with the dependencies it records.
+        if name in self.formulas:
+            for used in self.formulas.pop(name)[1]:
+                self.dependents[used].discard(name)
+        if formula is not None:
+            self.formulas[name] = formula
+            for used in formula[1]:
+                self.dependents.setdefault(used, set()).add(name)
+        self.variables.update(changed)
+
+    # Returns the set of the specified variable and every variable that depends on it, directly or through other
+    # variables.
+    def downstream(self, name: str) -> set:
+        found = {name}
+        stack = [name]
+        while len(stack) > 0:
+            for dependent in self.dependents.get(stack.pop(), ()):
+                if dependent not in found:
+                    found.add(dependent)
+                    stack.append(dependent)
+        return found
+
+    # Returns the variables that depend on the specified variable, directly or through other variables, in topological
+    # order: every variable comes after all of the variables its formula uses.
+    def ordered_dependents(self, name: str) -> List[str]:
+        # Count how many of the variables each affected variable's formula uses are themselves affected.
+        affected = self.downstream(name)
+        pending = {dependent: sum(used in affected for used in self.formulas[dependent][1])
+                   for dependent in affected if dependent != name}
+
+        # Repeatedly take the variables that no longer wait on any other affected variable.
+        order = []
+        ready = [name]
+        while len(ready) > 0:
+            for dependent in sorted(self.dependents.get(ready.pop(), ())):
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    order.append(dependent)
+                    ready.append(dependent)
+
+        # Any variable still waiting is part of a cycle, which assignments never create.
+        if len(order) != len(pending):
+            raise ValueError('Circular reference')
+        return order
+
+    @staticmethod
+    def parse_identifier(text: str) -> str:
+        # Ensure that the text consists of exactly one identifier, made up of valid characters.
+        try:
+            tokens = tokenize(text)
+        except SyntaxError:
+            raise NameError('Invalid identifier')
+        if len(tokens) != 1 or tokens[0].kind != IDENTIFIER:
+            raise NameError('Invalid identifier')
 
         # Return the variable's identifier.
-        return identifier
-
-    def evaluate(self):
-        # Raise an exception if the expression ends with an operator.
-        if self.symbols[-1] in self.valid_operators:
-            raise SyntaxError('Invalid expression')
-
-        # Rotate the deque one element to the left from the end string, back to the first symbol of the expression.
-        self.symbols.rotate(-1)
-
-        # Convert the expression stored in symbols from infix to postfix notation.
-        expression = self.postfix()
-
-        # Evaluate the converted postfix expression.
-        stack = deque()
-
-        # TODO
-        expression.appendleft(0)
-
-        # Iterate through the postfix expression from left to right.
-        expression.append(self.term)
-        while expression[0] != self.term:
-            if isinstance(expression[0], int):
-                # If the incoming element is a number, push it to the stack.
-                stack.append(expression[0])
-            elif expression[0] in self.valid_operators:
-                # If the incoming element is an operator, pop two values from the top of the stack, carry out the
-                # operation on them, and push the result onto the stack.
+        return tokens[0].text
+
+    def compile(self, expression: str) -> Program:
+        # Reuse the compiled expression if the same text has been compiled recently.
+        if expression in self.programs:
+            self.programs.move_to_end(expression)
+            return self.programs[expression]
+
+        # Split the expression into tokens and convert them from infix to postfix notation.
+        tokens = self.postfix(tokenize(expression), expression)
+
+        # Translate the postfix expression into instructions. Each distinct variable is given a slot, so that its value
+        # only has to be looked up once per evaluation.
+        code = []
+        names = []
+        for token in tokens:
+            if token.kind == NUMBER:
+                code.append((PUSH, self.number(int(token.text))))
+            elif token.kind == IDENTIFIER:
+                if token.text not in names:
+                    names.append(token.text)
+                code.append((LOAD, names.index(token.text)))
+            elif token.kind == UNARY:
+                code.append((NEG, None))
+            else:
+                code.append((OPCODES[token.text], None))
+
+        # Simplify the instructions, calculating constants as they would be calculated when evaluated.
+        if self.engine == 'decimal':
+            with decimal.localcontext(self.context):
+                code = self.optimize(code)
+        else:
+            code = self.optimize(code)
+        program = (tuple(code), tuple(names))
+
+        # Store the compiled expression, discarding the least recently used one if the cache is full.
+        self.programs[expression] = program
+        if len(self.programs) > self.cache_size:
+            self.programs.popitem(last=False)
+        return program
+
+    # Evaluates the specified program with the values of the Parser's variables, or of the specified variables if any.
+    def evaluate(self, program: Program, variables: Mapping = None):
+        code, names = program
+        if variables is None:
+            variables = self.variables
+
+        # Look up the values of the variables used by the expression. Variables bound to arrays are left as they are, in
+        # which case the instructions are carried out on every element of the arrays at once.
+        values = []
+        for name in names:
+            if name not in variables.keys():
+                raise ValueError('Unknown variable')
+            values.append(self.number(variables[name]))
+
+        # Decimal calculations are carried out with the Parser's precision.
+        if self.engine == 'decimal':
+            with decimal.localcontext(self.context):
+                return self.execute(code, values)
+        result = self.execute(code, values)
+        self.check_result(result)
+        return result
+
+    # Carries out the specified instructions, with the specified values of the variables in their slots, and returns the
+    # result.
+    def execute(self, code, values: list):
+        # Iterate through the instructions from left to right.
+        stack = []
+        for opcode, arg in code:
+            if opcode == PUSH:
+                # If the instruction pushes a number, push it to the stack.
+                stack.append(arg)
+            elif opcode == LOAD:
+                # If the instruction loads a variable, push its value to the stack.
+                stack.append(values[arg])
+            elif opcode == NEG:
+                # If the instruction negates a value, negate the value on top of the stack.
+                stack[-1] = self.negate(stack[-1])
+            else:
+                # If the instruction is an operator, pop two values from the top of the stack, carry out the operation
+                # on them, and push the result onto the stack.
                 op1 = stack.pop()
                 op2 = stack.pop()
-                if expression[0] == '+':
-                    stack.append(op2 + op1)
-                elif expression[0] == '-':
-                    stack.append(op2 - op1)
-                elif expression[0] == '*':
-                    stack.append(op2 * op1)
-                elif expression[0] == '/':
-                    stack.append(op2 // op1)
-                elif expression[0] == '^':
-                    stack.append(op2 ** op1)
-
-            # Rotate the expression deque past the current element.
-            expression.rotate(-1)
+                stack.append(self.operate(opcode, op2, op1))
 
         # Return the result of the expression.
         return stack[-1]
 
-    def postfix(self) -> Deque[Union[str, int]]:
-        # Create a new deque to store the new expression in postfix notation.
-        exp = deque()
-
-        # Create a new deque to act as a stack and temporarily store operators for reordering.
-        ops = deque()
-
-        # Rotate through symbols until the special terminating character is found.
-        while self.symbols[0] != self.term:
-            if self.symbols[0] in self.valid_operators or self.symbols[0] in '()':
-                # If the current symbol is an operator...
-                if len(ops) == 0 or ops[-1] == '(':
-                    # If the operator stack is empty or has a left parenthesis at the end, append the operator to it.
-                    ops.append(self.symbols[0])
-                elif self.symbols[0] == '(':
-                    # If the symbol is a left parenthesis, push it to the operator stack.
-                    ops.append(self.symbols[0])
-                elif self.symbols[0] == ')':
-                    # If the symbol is a right parenthesis, pop operators from the stack and add them to the resulting
-                    # expression until a left parenthesis is found.
-                    while len(ops) > 0 and ops[-1] != '(':
-                        exp.append(ops.pop())
-
-                    # If there are no more operators on the stack, there was no matching left parenthesis which means
-                    # the expression has unbalanced brackets.
-                    if len(ops) == 0:
-                        raise SyntaxError('Unbalanced brackets')
-
-                    # Pop the left parenthesis from the stack to discard it.
-                    ops.pop()
-                elif self.precedence(ops[-1]) > 0:
-                    # If the new operator has higher precedence than the top of the stack, push it to the stack.
-                    ops.append(self.symbols[0])
-                elif self.precedence(ops[-1]) <= 0:
-                    # If the new operator doesn't have higher precedence, pop operators from the stack and add them to
-                    # the resulting expression until an operator with smaller precedence or a left parenthesis is found.
-                    while len(ops) > 0 and self.precedence(ops[-1]) <= 0 and ops[-1] != '(':
-                        exp.append(ops.pop())
-
-                    # Now add the incoming operator to the stack.
-                    ops.append(self.symbols[0])
-            elif self.symbols[0].isdigit():
-                # If the current symbol consists only of digits, convert it to an integer and append it to the result.
-                exp.append(int(self.symbols[0]))
+    # Returns the negation of the specified value.
+    def negate(self, value):
+        if self.modulus is not None:
+            return -value % self.modulus
+        return -value
+
+    # Returns the result of the operator with the specified opcode applied to the specified operands.
+    def operate(self, opcode: int, op2, op1):
+        if opcode == ADD:
+            result = op2 + op1
+        elif opcode == SUB:
+            result = op2 - op1
+        elif opcode == MUL:
+            if self.checks_digits(op2, op1):
+                self.check_digits(math.floor(magnitude(largest(op2)) + magnitude(largest(op1))) + 1)
+            result = op2 * op1
+        elif opcode == DIV:
+            if has_zero(op1):
+                raise ZeroDivisionError('Division by zero')
+            if self.engine == 'int':
+                result = op2 // op1
             else:
-                # Otherwise, it is a variable, so append it's value to the result.
-                exp.append(int(self.variables[self.symbols[0]]))
-
-            # Rotate the deque past the current element
-            self.symbols.rotate(-1)
-
-        # Pop any remaining operators from the stack and add them to the resulting expression until it is empty.
-        while len(ops) > 0 and ops[-1] != '(':
+                result = op2 / op1
+        else:
+            result = self.power(op2, op1)
+        self.check_array(opcode, op2, op1, result)
+
+        if self.modulus is not None:
+            result %= self.modulus
+        return result
+
+    # Simplifies the specified instructions without changing their result. Constant sub-expressions are calculated once,
+    # here, rather than every time the expression is evaluated, double negations are removed, and operations that leave
+    # the other operand unchanged (x*1, 1*x, x+0, 0+x, x-0, x^1 and, with exact fractions, x/1) are dropped. Operations
+    # on constants that fail, such as divisions by zero, are kept so that they fail when the expression is evaluated.
+    def optimize(self, code: List[Tuple[int, Union[int, None]]]) -> List[Tuple[int, Union[int, None]]]:
+        # Decimal operations round their results to the precision and modular operations reduce them, so with those,
+        # dropping an operation on a variable could change its value. Likewise, floor division by 1 rounds down values
+        # made fractional by negative powers.
+        identities = self.engine != 'decimal' and self.modulus is None
+        dropped = (MUL, POW) if self.engine == 'int' else (MUL, DIV, POW)
+
+        # Symbolically evaluate the instructions. Each value on the stack is a tuple of the instructions that calculate
+        # it and, if it is a constant, its value, or None otherwise.
+        stack = []
+        for opcode, arg in code:
+            if opcode == PUSH:
+                stack.append(([(PUSH, arg)], arg))
+            elif opcode == LOAD:
+                stack.append(([(LOAD, arg)], None))
+            elif opcode == NEG:
+                instructions, value = stack.pop()
+                if value is not None:
+                    value = self.negate(value)
+                    stack.append(([(PUSH, value)], value))
+                elif identities and instructions[-1][0] == NEG:
+                    stack.append((instructions[:-1], None))
+                else:
+                    stack.append((instructions + [(NEG, None)], None))
+            else:
+                right, op1 = stack.pop()
+                left, op2 = stack.pop()
+                if op2 is not None and op1 is not None:
+                    try:
+                        value = self.operate(opcode, op2, op1)
+                    except ArithmeticError:
+                        pass
+                    else:
+                        stack.append(([(PUSH, value)], value))
+                        continue
+
+                if identities and op1 is not None and \
+                        (op1 == 1 and opcode in dropped or op1 == 0 and opcode in (ADD, SUB)):
+                    stack.append((left, op2))
+                elif identities and op2 is not None and (op2 == 1 and opcode == MUL or op2 == 0 and opcode == ADD):
+                    stack.append((right, op1))
+                else:
+                    stack.append((left + right + [(opcode, None)], None))
+
+        return stack[-1][0]
+
+    # Converts the specified integer to the Parser's numeric engine. Arrays are left as they are.
+    def number(self, value):
+        if is_array(value) or self.engine == 'int':
+            return value
+        elif self.engine == 'fraction':
+            return Fraction(value)
+        return decimal.Decimal(value)
+
+    # Returns whether the size of results of the specified operands has to be checked before they are calculated.
+    # Decimals have a fixed precision, NumPy arrays have fixed-size elements and results reduced modulo the Parser's
+    # modulus stay small, so only exact numbers and Columns of them are checked.
+    def checks_digits(self, a, b) -> bool:
+        return self.engine != 'decimal' and self.modulus is None and not is_numpy(a) and not is_numpy(b)
+
+    # Raises an OverflowError if a result which would have roughly the specified number of digits is too large to
+    # calculate, or too large for Python to convert to a string.
+    def check_digits(self, digits: float):
+        if digits > self.max_digits or 0 < STR_DIGITS < digits:
+            raise OverflowError('Result too large')
+
+    # Raises an OverflowError if the specified result of an exact engine, or any element of it, has too many digits to
+    # be printed.
+    def check_result(self, result):
+        if self.engine != 'decimal' and not is_numpy(result):
+            result = largest(result)
+            if not isinstance(result, float):
+                self.check_digits(count_digits(result))
+
+    # Raises an OverflowError if the specified result of the operator with the specified opcode, applied to the
+    # specified operands, is a NumPy array whose elements overflowed. Its 64-bit elements silently wrap around, so the
+    # operation is repeated with floating-point numbers, which only lose precision, to find the magnitude of the true
+    # results. Results too close to the limit for that to tell are calculated exactly with Python integers.
+    @staticmethod
+    def check_array(opcode: int, op2, op1, result):
+        if numpy is None or not isinstance(result, numpy.ndarray) or result.dtype != numpy.int64 \
+                or opcode not in WRAPPING_OPERATORS:
+            return
+        op = WRAPPING_OPERATORS[opcode]
+        with numpy.errstate(over='ignore', invalid='ignore'):
+            magnitude = numpy.abs(op(numpy.asarray(op2, dtype=numpy.float64), numpy.asarray(op1, dtype=numpy.float64)))
+        if not (magnitude < 2.0 ** 64).all():
+            raise OverflowError('Result too large')
+        if (magnitude >= 2.0 ** 62).any():
+            exact = op(numpy.asarray(op2, dtype=object), numpy.asarray(op1, dtype=object))
+            if not all(-2 ** 63 <= v < 2 ** 63 for v in exact.flat):
+                raise OverflowError('Result too large')
+
+    # Raises the specified base to the specified exponent. The size of the result is estimated before it is calculated,
+    # and with a modulus, the result is calculated by modular exponentiation without ever being calculated in full.
+    def power(self, base, exponent):
+        if self.modulus is not None and not is_numpy(base) and not is_numpy(exponent):
+            if isinstance(base, Column) or isinstance(exponent, Column):
+                return elementwise(base, exponent, self.power)
+            if exponent >= 0:
+                return pow(base, exponent, self.modulus)
+
+        # Raising a number to a power multiplies the logarithm of its size, or that of the larger of its numerator and
+        # denominator, by the power. Only bases other than 0, 1 and -1 grow, and only positive exponents can grow them
+        # without limit. For Columns, the largest base and the largest exponent are checked.
+        if self.checks_digits(base, exponent):
+            size = magnitude(largest(base))
+            exponent_bound = max(exponent.values, default=0) if isinstance(exponent, Column) else exponent
+            if size > 0 and exponent_bound > 0:
+                self.check_digits(math.floor(size * exponent_bound) + 1)
+
+        # Fractions raised to anything but a rational number are converted to floats, so Columns are raised element by
+        # element rather than by the Fraction.
+        if isinstance(base, Column) or isinstance(exponent, Column):
+            return elementwise(base, exponent, operator.pow)
+        return base ** exponent
+
+    # Converts the specified tokens of the specified expression from infix to postfix notation by way of the
+    # shunting-yard algorithm, checking the syntax of the expression along the way. A '+' or '-' at the start of the
+    # expression or directly after a left parenthesis is a unary sign; a unary '-' is converted to a UNARY token and a
+    # unary '+' is dropped.
+    @staticmethod
+    def postfix(tokens: List[Token], expression: str) -> List[Token]:
+        # Create a list to store the new expression in postfix notation, and a stack to temporarily store operators for
+        # reordering.
+        exp = []
+        ops = []
+
+        # Track whether the next token must be an operand (a number, variable, left parenthesis or unary sign) or not.
+        expect_operand = True
+        previous = None
+        for token in tokens:
+            if token.kind in (NUMBER, IDENTIFIER):
+                # Numbers and variables are appended to the result as they are.
+                if not expect_operand:
+                    raise syntax_error('Invalid expression', expression, token.pos)
+                exp.append(token)
+                expect_operand = False
+            elif token.kind == LPAREN:
+                # Left parentheses are pushed to the operator stack.
+                if not expect_operand:
+                    raise syntax_error('Invalid expression', expression, token.pos)
+                ops.append(token)
+            elif token.kind == RPAREN:
+                # Right parentheses pop operators from the stack and add them to the result until the matching left
+                # parenthesis is found, which is discarded.
+                if expect_operand:
+                    raise syntax_error('Invalid expression', expression, token.pos)
+                while len(ops) > 0 and ops[-1].kind != LPAREN:
+                    exp.append(ops.pop())
+
+                # If there are no more operators on the stack, there was no matching left parenthesis which means the
+                # expression has unbalanced brackets.
+                if len(ops) == 0:
+                    raise syntax_error('Unbalanced brackets', expression, token.pos)
+                ops.pop()
+            elif token.kind == OPERATOR and expect_operand:
+                # An operator where an operand is expected is only valid as a unary sign.
+                if token.text not in '+-' or (previous is not None and previous.kind != LPAREN):
+                    raise syntax_error('Invalid expression', expression, token.pos)
+                if token.text == '-':
+                    ops.append(Token(UNARY, token.text, token.pos))
+            elif token.kind == OPERATOR:
+                # Pop operators with higher or equal precedence from the stack and add them to the result, then push the
+                # incoming operator to the stack.
+                while len(ops) > 0 and ops[-1].kind != LPAREN and \
+                        PRECEDENCE[ops[-1].text] >= PRECEDENCE[token.text]:
+                    exp.append(ops.pop())
+                ops.append(token)
+                expect_operand = True
+            else:
+                raise syntax_error('Invalid expression', expression, token.pos)
+            previous = token
+
+        # The expression must not be empty or end with an operator.
+        if expect_operand:
+            raise syntax_error('Invalid expression', expression, len(expression))
+
+        # Pop any remaining operators from the stack and add them to the resulting expression until it is empty. If the
+        # stack still contains a parenthesis, there was no matching right parenthesis meaning the expression has
+        # unbalanced brackets.
+        while len(ops) > 0:
+            if ops[-1].kind == LPAREN:
+                raise syntax_error('Unbalanced brackets', expression, ops[-1].pos)
             exp.append(ops.pop())
 
-        # If the operator stack still contains a parenthesis, there was no matching right parenthesis meaning the
-        # expression has unbalanced brackets.
-        if len(ops) > 0 and '(' in ops:
-            raise SyntaxError('Unbalanced brackets')
-
         # Return the postfix representation of the expression.
         return exp
 
-    # Returns an integer value which represents whether the operator at the front of the symbols deque has higher (1),
-    # lower (-1), or equal (0) precedence than or to the specified operator.
-    def precedence(self, top: str) -> int:
-        if top in '+-':
-            if self.symbols[0] in '+-':
-                return 0
-            else:
-                return 1
-        elif top in '*/':
-            if self.symbols[0] in '*/':
-                return 0
-            elif self.symbols[0] in '+-':
-                return -1
-            else:
-                return 1
-        elif top == '^':
-            if self.symbols[0] == '^':
-                return 0
-            else:
-                return -1
-
 
-# Create a Parser object to handle user input until it exits the program when the user enters the '/exit' command.
-parser = Parser()
-while True:
-    parser.command(input())
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Smart Calculator')
+    arg_parser.add_argument('--batch', metavar='FILE', nargs='?', const='-',
+                            help="run every line of FILE (or standard input if FILE is omitted or '-') and exit")
+    arg_parser.add_argument('--engine', choices=Parser.engines, default='int',
+                            help='numbers to calculate with (default: int)')
+    arg_parser.add_argument('--precision', type=int, default=28,
+                            help='significant digits of the decimal engine (default: 28)')
+    arg_parser.add_argument('--max-digits', type=int, default=4300,
+                            help='digits above which exact results are refused (default: 4300)')
+    arg_parser.add_argument('--modulus', type=int, help='reduce integer results modulo this number')
+    arg_parser.add_argument('--reactive', action='store_true',
+                            help='allow variables to be assigned formulas that are kept up to date')
+    args = arg_parser.parse_args()
+
+    try:
+        parser = Parser(args.engine, args.precision, args.max_digits, args.modulus, args.reactive)
+    except ValueError as e:
+        arg_parser.error(str(e))
+
+    if args.batch is not None:
+        # Run the lines of the file as a stream, then report how many lines were run and how long it took.
+        source = sys.stdin if args.batch == '-' else open(args.batch)
+        with source:
+            stats = parser.run_batch(source, sys.stdout, sys.stderr)
+        print('{} lines, {} errors in {:.3f} s'.format(stats['lines'], stats['errors'], stats['seconds']),
+              file=sys.stderr)
+    else:
+        # Use the Parser to handle user input until it exits the program when the user enters the '/exit' command.
+        while True:
+            parser.command(input())
@@ -1,16 +1,123 @@
-from random import randrange
+import argparse
+import json
+import mmap
+import os
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from enum import Enum, auto
+from time import perf_counter, time
+import tracemalloc
 from typing import Mapping
 
 
+# The indices of each of the '3-in-a-row' locations of a 3x3 Board.
+WIN_LINES = ((0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6))
+
+# The 8 symmetries (rotations and reflections) of a 3x3 Board, each expressed as a permutation of cell indices such that
+# cell i of the transformed Board holds cell perm[i] of the original Board.
+SYMMETRIES = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8),  # identity
+    (6, 3, 0, 7, 4, 1, 8, 5, 2),  # rotation by 90 degrees clockwise
+    (8, 7, 6, 5, 4, 3, 2, 1, 0),  # rotation by 180 degrees
+    (2, 5, 8, 1, 4, 7, 0, 3, 6),  # rotation by 90 degrees counter-clockwise
+    (2, 1, 0, 5, 4, 3, 8, 7, 6),  # reflection along the vertical line
+    (6, 7, 8, 3, 4, 5, 0, 1, 2),  # reflection along the horizontal line
+    (0, 3, 6, 1, 4, 7, 2, 5, 8),  # reflection along the main diagonal
+    (8, 5, 2, 7, 4, 1, 6, 3, 0),  # reflection along the side diagonal
+)
+
+# The base-3 digit used to encode each kind of cell.
+CELL_CODES = {' ': 0, 'X': 1, 'O': 2}
+
+# The default location of the opening book of perfect 3x3 moves, next to this file.
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tictactoe.book')
+
+# The value stored in the opening book for positions which have no move (unreachable or finished positions).
+BOOK_NO_MOVE = 255
+
+# The positions on which the AI is benchmarked, as strings of the cells of a 3x3 Board, each with X to move.
+BENCHMARK_POSITIONS = {
+    'empty': '         ',
+    'midgame': 'X  O X O ',
+    'endgame': 'XOXXO O  ',
+}
+
+# The time below which benchmark timings are too noisy to compare, in seconds.
+BENCHMARK_NOISE_FLOOR = 1e-4
+
+# The score of a won game in a search with alpha-beta pruning, which must be larger than any heuristic score.
+WIN_SCORE = 10 ** 9
+
+
+# Describes the shape of a Board with the specified number of rows and columns on which the specified number of marks
+# in a row are needed to win, along with everything about that shape which is needed to analyze Boards quickly.
+class Geometry:
+    def __init__(self, n_rows: int, n_cols: int, win_len: int):
+        if n_rows < 1 or n_cols < 1 or not 0 < win_len <= max(n_rows, n_cols):
+            raise ValueError('Invalid board size')
+
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.win_len = win_len
+        self.n_cells = n_rows * n_cols
+
+        # Find the indices of each of the 'k-in-a-row' locations of the Board: rows first, then columns, then '\'
+        # diagonals, then '/' diagonals.
+        lines = []
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for r in range(n_rows):
+                for c in range(n_cols):
+                    if 0 <= r + dr * (win_len - 1) < n_rows and 0 <= c + dc * (win_len - 1) < n_cols:
+                        lines.append(tuple((r + dr * i) * n_cols + c + dc * i for i in range(win_len)))
+        self.lines = tuple(lines)
+
+        # For each cell, find the locations which pass through it, since only those can be completed by a move there.
+        self.lines_through = tuple(tuple(line for line in self.lines if i in line) for i in range(self.n_cells))
+
+        # Bit masks of the above locations, for use by BitBoards.
+        self.masks = tuple(sum(1 << i for i in line) for line in self.lines)
+        self.masks_through = tuple(tuple(sum(1 << i for i in line) for line in lines_through)
+                                   for lines_through in self.lines_through)
+
+        # For each cell, find the cells which surround it.
+        self.neighbours = tuple(
+            tuple(r * n_cols + c
+                  for r in range(max(i // n_cols - 1, 0), min(i // n_cols + 2, n_rows))
+                  for c in range(max(i % n_cols - 1, 0), min(i % n_cols + 2, n_cols))
+                  if r * n_cols + c != i)
+            for i in range(self.n_cells))
+
+        # The order in which moves are searched: cells which are part of the most locations first, which on a 3x3 Board
+        # means centre first, then corners, then edges.
+        self.move_order = tuple(sorted(range(self.n_cells), key=lambda i: -len(self.lines_through[i])))
+
+    # Returns whether the mark in the cell at the specified index of the specified list of cells is part of a
+    # 'k-in-a-row', i.e. whether a move there won the game.
+    def is_win(self, cells: [str], idx: int) -> bool:
+        mark = cells[idx]
+        for line in self.lines_through[idx]:
+            if all(cells[i] == mark for i in line):
+                return True
+        return False
+
+
+# Returns the (shared) Geometry of Boards of the specified shape.
+@lru_cache(maxsize=None)
+def get_geometry(n_rows: int, n_cols: int, win_len: int) -> Geometry:
+    return Geometry(n_rows, n_cols, win_len)
+
+
 # Defines the structure of the tic-tac-toe game board and provides useful operators and methods for changing and
-# analyzing it in the context of a Game.
+# analyzing it in the context of a Game. Boards are 3x3 with 3 in a row needed to win unless otherwise specified.
 class Board:
-    n_rows = 3
-    n_cols = 3
-
-    def __init__(self):  # creates an empty Board
-        self.board = [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ']
+    def __init__(self, n_rows=3, n_cols=3, win_len=3):  # creates an empty Board
+        self.geometry = get_geometry(n_rows, n_cols, win_len)
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.win_len = win_len
+        self.board = [' '] * self.geometry.n_cells
 
     # An implementation of the '[]' indexing operator which allows for the retrieval of a value at a specific index as
     # though Board objects were lists themselves.
@@ -22,6 +129,10 @@ class Board:
     def __setitem__(self, item: int, value: str):
         self.board[item] = value
 
+    # An implementation of the len() function which returns the number of cells in the Board.
+    def __len__(self) -> int:
+        return len(self.board)
+
     # A method which returns a nested list of lists containing each row's elements.
     def rows(self) -> [[]]:
         rows = []
@@ -33,31 +144,26 @@ class Board:
     def cols(self) -> [[]]:
         cols = []
         for i in range(self.n_cols):
-            cols.append(self.board[i * self.n_rows::self.n_cols])
+            cols.append(self.board[i::self.n_cols])
         return cols
 
-    # A method which determines the current state of the Board (win_x, win_o, draw, incomplete).
-    def state(self):
-        for r in self.rows():  # Check rows for 3 consecutive occurrences of either 'X' or 'O'.
-            if r.count('X') == 3:
-                return 'win_x'
-            elif r.count('O') == 3:
-                return 'win_o'
+    # A method which determines the current state of the Board (win_x, win_o, draw, incomplete). If the index of the
+    # last move made is specified, the Board is assumed to have been incomplete before it, so only the locations which
+    # pass through that cell are checked.
+    def state(self, last=None):
+        if last is None:
+            lines = self.geometry.lines
+        else:
+            lines = self.geometry.lines_through[last]
 
-        for c in self.cols():  # Check columns for 3 consecutive occurrences of either 'X' or 'O'.
-            if c.count('X') == 3:
+        # Check each location for k consecutive occurrences of either 'X' or 'O'.
+        for line in lines:
+            marks = [self.board[i] for i in line]
+            if marks.count('X') == self.win_len:
                 return 'win_x'
-            elif c.count('O') == 3:
+            elif marks.count('O') == self.win_len:
                 return 'win_o'
 
-        # Check diagonals for 3 consecutive occurrences of either 'X' or 'O'.
-        if [self.board[0], self.board[4], self.board[8]].count('X') == 3 or \
-                [self.board[6], self.board[4], self.board[2]].count('X') == 3:
-            return 'win_x'
-        if [self.board[0], self.board[4], self.board[8]].count('O') == 3 or \
-                [self.board[6], self.board[4], self.board[2]].count('O') == 3:
-            return 'win_o'
-
         # Board is a draw if neither player won, but there are no empty cells remaining.
         if self.board.count(' ') == 0:
             return 'draw'
@@ -71,10 +177,94 @@ class Board:
 
     # A method which prints a formatted representation of the Board's cells.
     def print(self):
-        print('-' * 9)
+        print('-' * (2 * self.n_cols + 3))
+        for row in self.rows():
+            print('| ' + ' '.join(row) + ' |')
+        print('-' * (2 * self.n_cols + 3))
+
+
+# An alternative, compact representation of the tic-tac-toe game Board which stores the cells marked by each player as
+# the bits of an integer (bit i is set if cell i holds that player's mark). Wins are detected by comparing these
+# integers against precomputed masks of each 'k-in-a-row' location, rather than by building and counting lists of
+# cells. Provides the same operators and methods as Board, so the two can be used interchangeably by a Game.
+class BitBoard:
+    def __init__(self, n_rows=3, n_cols=3, win_len=3):  # creates an empty BitBoard
+        self.geometry = get_geometry(n_rows, n_cols, win_len)
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.win_len = win_len
+
+        # The mask of a BitBoard with every cell marked.
+        self.full_mask = (1 << self.geometry.n_cells) - 1
+
+        self.x = 0
+        self.o = 0
+
+    # An implementation of the '[]' indexing operator which returns the mark stored in the cell at the specified index.
+    def __getitem__(self, item: int) -> str:
+        bit = 1 << item
+        if self.x & bit:
+            return 'X'
+        elif self.o & bit:
+            return 'O'
+        return ' '
+
+    # An implementation of the '=' assignment operator which marks the cell at the specified index. Any value other
+    # than 'X' or 'O' empties the cell.
+    def __setitem__(self, item: int, value: str):
+        bit = 1 << item
+        self.x &= ~bit
+        self.o &= ~bit
+        if value == 'X':
+            self.x |= bit
+        elif value == 'O':
+            self.o |= bit
+
+    # An implementation of the len() function which returns the number of cells in the BitBoard.
+    def __len__(self) -> int:
+        return self.geometry.n_cells
+
+    # A method which returns a nested list of lists containing each row's elements.
+    def rows(self) -> [[]]:
+        return [[self[r * self.n_cols + c] for c in range(self.n_cols)] for r in range(self.n_rows)]
+
+    # A method which returns a nested list of lists containing each column's elements.
+    def cols(self) -> [[]]:
+        return [[self[r * self.n_cols + c] for r in range(self.n_rows)] for c in range(self.n_cols)]
+
+    # A method which determines the current state of the BitBoard (win_x, win_o, draw, incomplete). If the index of the
+    # last move made is specified, the BitBoard is assumed to have been incomplete before it, so only the locations
+    # which pass through that cell are checked.
+    def state(self, last=None):
+        if last is None:
+            masks = self.geometry.masks
+        else:
+            masks = self.geometry.masks_through[last]
+
+        for mask in masks:
+            if self.x & mask == mask:
+                return 'win_x'
+            elif self.o & mask == mask:
+                return 'win_o'
+
+        # BitBoard is a draw if neither player won, but there are no empty cells remaining.
+        if self.x | self.o == self.full_mask:
+            return 'draw'
+
+        # BitBoard incomplete if none of the above conditions are satisfied.
+        return 'incomplete'
+
+    # A simple method which returns a boolean value indicating whether or not the specified mark has won the BitBoard.
+    def is_winner(self, mark: str) -> bool:
+        bits = self.x if mark == 'X' else self.o
+        return any(bits & mask == mask for mask in self.geometry.masks)
+
+    # A method which prints a formatted representation of the BitBoard's cells.
+    def print(self):
+        print('-' * (2 * self.n_cols + 3))
         for row in self.rows():
             print('| ' + ' '.join(row) + ' |')
-        print('-' * 9)
+        print('-' * (2 * self.n_cols + 3))
 
 
 # Defines a player in a game of tic-tac-toe.
@@ -85,25 +275,63 @@ class Player:
         EASY = auto()
         MEDIUM = auto()
         HARD = auto()
+        ALPHABETA = auto()
+        BOOK = auto()
 
-    def __init__(self, p_type: PType, mark: str):
+    # A transposition table shared by every Player in the process, mapping the canonical code of a position (see the
+    # canonical function) and the mark whose turn it is to the position's value and best move.
+    transpositions = {}
+
+    # The opening book shared by every Player in the process, memory-mapped from disk when first needed.
+    book = None
+
+    # The time, in seconds, which a Player may spend searching for a move on a Board too large to search completely.
+    time_budget = 1.0
+
+    # The number of processes across which a Player's alpha-beta searches are split (1 to search serially).
+    workers = 1
+
+    # The pool of processes shared by every Player in the process which searches are split across, created when first
+    # needed, and the number of processes in it.
+    executor = None
+    executor_workers = 0
+
+    # Players pick random moves with the specified random number generator (the random module itself by default), and
+    # only announce their moves if they are verbose.
+    def __init__(self, p_type: PType, mark: str, rng=random, verbose=True):
         self.p_type = p_type
         self.mark = mark
+        self.rng = rng
+        self.verbose = verbose
         if mark == 'X':
             self.opp = 'O'
         else:
             self.opp = 'X'
 
+        # The number of positions visited by the Player's most recent search.
+        self.nodes = 0
+
+        # The Geometry of the Board being searched, the depth at which the search is cut off (None if the search is
+        # complete), and the time by which it must finish (None if the search is not timed).
+        self.geometry = None
+        self.max_depth = None
+        self.deadline = None
+
     # Calculates and returns the coordinates of an AI player's move based on it's corresponding difficulty.
     def calc_move(self, board: Board) -> int:
-        print('Making move level "{}"'.format(self.p_type.name.lower()))
+        if self.verbose:
+            print('Making move level "{}"'.format(self.p_type.name.lower()))
 
         if self.p_type == self.PType.EASY:
-            return check_rand(board)
+            return check_rand(board, self.rng)
         elif self.p_type == self.PType.MEDIUM:
             return self.calc_move_medium(board)
         elif self.p_type == self.PType.HARD:
             return self.calc_move_hard(board)
+        elif self.p_type == self.PType.ALPHABETA:
+            return self.calc_move_alphabeta(board)
+        elif self.p_type == self.PType.BOOK:
+            return self.calc_move_book(board)
 
     # Calculates the move of a 'medium' AI by calling the check_rows, check_cols, and check_diag functions, and if there
     # is not enough information for those algorithms to select a move, reverts to the calc_move_easy method to pick a
@@ -111,135 +339,385 @@ class Player:
     def calc_move_medium(self, board: Board) -> int:
         n = check_win_shallow(board, self.mark)
         if n == -1:
-            return check_rand(board)
+            return check_rand(board, self.rng)
         else:
             return n
 
-    # Calculates the move of a 'hard' AI by way of an implementation of a brute-force minimax algorithm.
+    # Calculates the move of a 'hard' AI by way of an implementation of a minimax algorithm backed by a transposition
+    # table. The transposition table only covers 3x3 Boards, so on any other Board an alpha-beta search is used instead.
     def calc_move_hard(self, board: Board) -> int:
-        # Create a new board object and copy the cells from the original board to it, replacing empty cells with their
-        # index.
-        new_board = Board()
-        for i in range(9):
-            if board[i] == ' ':
-                new_board[i] = str(i)
-            else:
-                new_board[i] = board[i]
+        if (board.n_rows, board.n_cols, board.win_len) != (3, 3, 3):
+            return self.calc_move_alphabeta(board)
 
         # Return the value associated with the 'index' key in the mapping returned by the minimax function.
-        return self.minimax(new_board, self.mark)['index']
-
-    # A brute-force implementation of the minimax algorithm which recursively assesses all possible outcomes of the
-    # specified game board. This is accomplished by first weighting each possible outcome of the game based on the
-    # desired outcome. Therefore, since an AI Player is attempting to win the game, the possible outcomes are weighted
-    # as follows: win = +10 (desirable outcome), tie = 0 (neutral outcome), and loss = -10 (undesirable outcome). To
-    # determine the 'best' move for the AI to make at any point in the game, each of the moves that can be made are
-    # evaluated by finding the best score of all of the moves that can be made immediately following the first move.
-    # This pattern recurs until one of the base cases is reached and a move object is returned. Once scores have been
-    # calculated for all of the possible moves at any level, the 'best' move is chosen based on who the player is at the
-    # current level of recursion. If the current player is the original player, the highest score is chosen since that
-    # player is trying to win. Otherwise, if the current player is the opponent of the original player, the lowest score
-    # is chosen since the original player is trying to beat the current player.
+        self.nodes = 0
+        return self.minimax(board, self.mark)['index']
+
+    # An implementation of the minimax algorithm which recursively assesses all possible outcomes of the specified game
+    # board. This is accomplished by first weighting each possible outcome of the game based on the desired outcome.
+    # Therefore, since an AI Player is attempting to win the game, the possible outcomes are weighted as follows:
+    # win = +10 (desirable outcome), tie = 0 (neutral outcome), and loss = -10 (undesirable outcome). The best move for
+    # the player whose turn it is is the one with the best score of all of the moves that can be made immediately after
+    # it, a pattern which recurs until the game is won, lost or tied. Rather than re-searching the game tree on every
+    # move, the value of every position that is searched is stored in the transposition table shared by all Players,
+    # so that each distinct position (up to rotation and reflection of the Board) is only ever searched once per
+    # process. Empty cells of the specified Board may be marked with either ' ' or their index.
     def minimax(self, new_board: Board, turn_mark: str) -> Mapping[str, int]:
-        # Determine and store the locations of cells where moves can be made on the current board.
-        avail_idxes = []
-        for i in range(9):
-            if new_board[i].isdigit() or new_board[i] == ' ':
-                avail_idxes.append(i)
+        cells = [' ' if new_board[i].isdigit() else new_board[i] for i in range(9)]
+        value, index = self.search(cells, turn_mark)
+
+        # Values are stored from the point of view of X, so flip their sign if the original player is O.
+        move = {'score': value if self.mark == 'X' else -value}
+        if index != -1:
+            move['index'] = index
+        return move
+
+    # Looks up the value and best move of the specified cells, with the specified mark to move, in the transposition
+    # table, searching the position first if it has not been seen before. Returns a tuple of the position's value from
+    # X's point of view and the index of the best move (-1 if the game is already over).
+    def search(self, cells: [str], turn_mark: str) -> (int, int):
+        self.nodes += 1
+        code, perm = canonical(cells)
+        key = 2 * code + (turn_mark == 'O')
+
+        entry = self.transpositions.get(key)
+        if entry is None:
+            entry = self.solve([cells[p] for p in perm], turn_mark)
+            self.transpositions[key] = entry
 
+        # Map the best move from the canonical orientation of the Board back to the orientation of the specified cells.
+        value, best = entry
+        return value, perm[best] if best != -1 else -1
+
+    # Searches every move that can be made from the specified (canonical) cells and returns a tuple of the position's
+    # value from X's point of view and the index of the best move for the player whose turn it is. X picks the move with
+    # the highest value and O picks the move with the lowest, with ties going to the lowest index.
+    def solve(self, cells: [str], turn_mark: str) -> (int, int):
         # Handle the recursive base cases of win, loss and tie.
-        if new_board.is_winner(self.mark):
-            # If the player who originally called the minimax function wins the current board, return a positive score.
-            return {'score': 10}
-        elif new_board.is_winner(self.opp):
-            # If the opponent of the player who originally called the minimax function wins the current board (i.e the
-            # original player loses the current board), return a negative score.
-            return {'score': -10}
-        elif len(avail_idxes) == 0:
-            # If neither player wins on the current board, and there are no moves left to make, the result is a tie, so
-            # return a neutral score.
-            return {'score': 0}
-
-        # Determine the mark of the opponent of the player whose turn it is.
+        mark = winner(cells)
+        if mark == 'X':
+            return 10, -1
+        elif mark == 'O':
+            return -10, -1
+        elif ' ' not in cells:
+            return 0, -1
+
         turn_opp = 'O' if turn_mark == 'X' else 'X'
+        best_value = None
+        best_move = -1
+        for i in range(9):
+            if cells[i] != ' ':
+                continue
 
-        # Iterate through all available cells and store objects representing all possible moves.
-        moves = []
-        for i in range(len(avail_idxes)):
-            # Create an object for the current move and store the index of the cell.
-            move = {'index': int(new_board[avail_idxes[i]])}
-
-            # Set the empty cell to the current player's mark.
-            new_board[avail_idxes[i]] = turn_mark
-
-            # The recursive case. Find the resulting score of calling the minimax function for the opponent of the
-            # current player. Since the current cell was marked with the current player's mark, this call to minimax
-            # will proceed as though the current player made that move.
-            result = self.minimax(new_board, turn_opp)
-            move['score'] = result['score']
-
-            # Change the current cell back to the value it had previously and add the move object to the list of moves.
-            new_board[avail_idxes[i]] = str(move['index'])
-            moves.append(move)
-
-        # Determine the best move to make, depending on whether or not the current player is the player that originally
-        # called the minimax function.
-        best_move = 0
-        best_score = moves[0]['score']
-        if turn_mark == self.mark:
-            # If the current player is the player that originally called the minimax function, iterate through the
-            # results of all currently possible moves and store the largest score.
-            i = 0
-            for m in moves:
-                if m['score'] > best_score:
-                    best_score = m['score']
-                    best_move = i
-                i += 1
-        else:
-            # Otherwise, the current player is opponent of the player that originally called the minimax function.
-            # Iterate through the results of all currently possible moves and store the smallest score.
-            i = 0
-            for m in moves:
-                if m['score'] < best_score:
-                    best_score = m['score']
+            # Mark the empty cell, find the value of the resulting position, then empty the cell again.
+            cells[i] = turn_mark
+            value = self.search(cells, turn_opp)[0]
+            cells[i] = ' '
+
+            if best_value is None or (value > best_value if turn_mark == 'X' else value < best_value):
+                best_value = value
+                best_move = i
+        return best_value, best_move
+
+    # Calculates the move of a 'book' AI by looking up the position in the opening book, which holds the perfect move of
+    # every reachable 3x3 position at the index given by its base-3 code. The book is built and saved first if it does
+    # not exist yet. The book only covers 3x3 Boards, so on any other Board, or if the book can't be read or saved, a
+    # 'hard' move is made instead.
+    def calc_move_book(self, board: Board) -> int:
+        if (board.n_rows, board.n_cols, board.win_len) != (3, 3, 3):
+            return self.calc_move_hard(board)
+
+        if Player.book is None:
+            try:
+                Player.book = load_book(BOOK_PATH)
+            except OSError:
+                # Use an empty book rather than building it again for every move, so every position falls back to a
+                # search.
+                Player.book = bytes([BOOK_NO_MOVE]) * 3 ** 9
+        move = self.book[encode([board[i] for i in range(9)])]
+
+        # Fall back to a search for positions that cannot be reached in a game (e.g. set up by hand).
+        if move == BOOK_NO_MOVE:
+            return self.calc_move_hard(board)
+        return move
+
+    # Calculates the move of an 'alphabeta' AI by way of a minimax search with alpha-beta pruning. Boards with at most 9
+    # cells are searched completely. Larger Boards are searched with iterative deepening within the Player's time
+    # budget.
+    def calc_move_alphabeta(self, board: Board) -> int:
+        cells = [board[i] for i in range(len(board))]
+        self.geometry = board.geometry
+        self.nodes = 0
+
+        if len(cells) <= 9:
+            self.max_depth = None
+            self.deadline = None
+            return self.search_root(cells, self.candidate_moves(cells))[1]
+        return self.calc_move_deepening(cells)
+
+    # Searches the specified cells to increasing depths until the Player's time budget runs out or the result of the
+    # game is decided, and returns the best move found by the deepest search which finished. Each search tries the best
+    # move found by the previous one first, which makes the most of alpha-beta pruning.
+    def calc_move_deepening(self, cells: [str]) -> int:
+        self.deadline = perf_counter() + self.time_budget
+
+        moves = self.candidate_moves(cells)
+        best_move = moves[0]
+        for depth in range(1, cells.count(' ') + 1):
+            self.max_depth = depth
+            try:
+                # Search a copy of the cells, since a search which runs out of time leaves its moves marked.
+                score, best_move = self.search_root(list(cells), moves)
+            except SearchTimeout:
+                break
+
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+            if abs(score) > WIN_SCORE - len(cells):
+                break
+        return best_move
+
+    # Searches each of the specified moves, in order, from the specified cells and returns a tuple of the best score and
+    # the first move which achieves it.
+    def search_root(self, cells: [str], moves: [int]) -> (int, int):
+        if self.workers > 1 and len(moves) > 1:
+            return self.search_root_parallel(cells, moves)
+
+        best_score = None
+        best_move = -1
+        alpha = -WIN_SCORE
+        for i in moves:
+            cells[i] = self.mark
+            score = self.alphabeta(cells, self.opp, 1, alpha, WIN_SCORE, i)
+            cells[i] = ' '
+
+            if best_score is None or score > best_score:
+                best_score = score
+                best_move = i
+                alpha = max(alpha, score)
+        return best_score, best_move
+
+    # Shuts down the pool of processes shared by every Player, if it was created. Processes which are themselves workers
+    # of a pool must do this before they finish, as they wait for their own worker processes to exit.
+    @staticmethod
+    def shutdown_executor():
+        if Player.executor is not None:
+            Player.executor.shutdown()
+            Player.executor = None
+            Player.executor_workers = 0
+
+    # Searches each of the specified moves from the specified cells in a separate process, and returns the same result
+    # as search_root. Each subtree is searched without the bounds established by the moves before it, so every score is
+    # exact, and the first move in the specified order with the best score is chosen, exactly as in a serial search.
+    def search_root_parallel(self, cells: [str], moves: [int]) -> (int, int):
+        # Replace the shared pool if the number of workers changed since it was created.
+        if Player.executor is None or Player.executor_workers != self.workers:
+            Player.shutdown_executor()
+            Player.executor = ProcessPoolExecutor(self.workers)
+            Player.executor_workers = self.workers
+
+        shape = (self.geometry.n_rows, self.geometry.n_cols, self.geometry.win_len)
+        # Pass the deadline on as a wall-clock time, since subtrees may only start once a process frees up.
+        deadline = None if self.deadline is None else time() + self.deadline - perf_counter()
+        futures = [self.executor.submit(search_subtree, self.mark, shape, cells, i, self.max_depth, deadline)
+                   for i in moves]
+
+        best_score = None
+        best_move = -1
+        try:
+            for i, future in zip(moves, futures):
+                score, nodes = future.result()
+                self.nodes += nodes
+                if best_score is None or score > best_score:
+                    best_score = score
                     best_move = i
-                i += 1
+        finally:
+            # Don't leave the remaining subtrees searching if one of them ran out of time.
+            for future in futures:
+                future.cancel()
+        return best_score, best_move
+
+    # A minimax search with alpha-beta pruning which returns the score of the specified cells from the point of view of
+    # the Player, with the specified mark to move and the last move having been made at the specified index. Alpha is
+    # the score that the Player is already assured of elsewhere in the tree and beta is the score that its opponent is
+    # already assured of, so once they cross, none of the remaining moves from the current position can affect the
+    # result and they are skipped. Scores are depth-aware: a win scores WIN_SCORE less the number of moves taken to
+    # reach it, and a loss scores the number of moves less WIN_SCORE, so that faster wins and slower losses are
+    # preferred. Positions at the maximum depth of the search are scored heuristically.
+    def alphabeta(self, cells: [str], turn_mark: str, depth: int, alpha: int, beta: int, last: int) -> int:
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % 1024 == 0 and perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        # Handle the recursive base cases of win, loss and tie. Only the player who made the last move can have won, and
+        # only by way of the cell they marked.
+        if self.geometry.is_win(cells, last):
+            return WIN_SCORE - depth if cells[last] == self.mark else depth - WIN_SCORE
+        moves = self.candidate_moves(cells)
+        if len(moves) == 0:
+            return 0
+        if self.max_depth is not None and depth >= self.max_depth:
+            return self.evaluate(cells)
+
+        turn_opp = 'O' if turn_mark == 'X' else 'X'
+        for i in moves:
+            cells[i] = turn_mark
+            score = self.alphabeta(cells, turn_opp, depth + 1, alpha, beta, i)
+            cells[i] = ' '
+
+            # The Player maximizes its score and its opponent minimizes it.
+            if turn_mark == self.mark:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                break
+        return alpha if turn_mark == self.mark else beta
+
+    # Returns the empty cells of the specified list of cells in the order in which they should be searched. On Boards
+    # with more than 9 cells, only cells next to a marked cell are considered, since moves far from the action are
+    # almost never best.
+    def candidate_moves(self, cells: [str]) -> [int]:
+        order = self.geometry.move_order
+        if len(cells) <= 9 or cells.count(' ') == len(cells):
+            return [i for i in order if cells[i] == ' ']
+        return [i for i in order if cells[i] == ' ' and any(cells[n] != ' ' for n in self.geometry.neighbours[i])]
+
+    # Heuristically scores the specified cells from the point of view of the Player. Every location which only holds
+    # the marks of one player is worth 4 to the power of the number of marks to that player.
+    def evaluate(self, cells: [str]) -> int:
+        score = 0
+        for line in self.geometry.lines:
+            mine = 0
+            theirs = 0
+            for i in line:
+                if cells[i] == self.mark:
+                    mine += 1
+                elif cells[i] == self.opp:
+                    theirs += 1
+
+            if theirs == 0 and mine > 0:
+                score += 4 ** mine
+            elif mine == 0 and theirs > 0:
+                score -= 4 ** theirs
+        return score
+
+
+# Raised by a Player's search when it runs out of time.
+class SearchTimeout(Exception):
+    pass
+
+
+# Searches the subtree of a single root move for a parallel search: marks the cell at the specified index of the
+# specified cells with the specified mark, searches the resulting position on a Board of the specified shape to the
+# specified depth (None for a complete search) before the specified wall-clock time (None for no limit), and returns a
+# tuple of its score and the number of nodes searched.
+def search_subtree(mark: str, shape: (int, int, int), cells: [str], move: int, max_depth, deadline) -> (int, int):
+    player = Player(Player.PType.ALPHABETA, mark, verbose=False)
+    player.geometry = get_geometry(*shape)
+    player.max_depth = max_depth
+    if deadline is not None:
+        if time() > deadline:
+            raise SearchTimeout()
+        player.deadline = perf_counter() + deadline - time()
+
+    cells[move] = mark
+    score = player.alphabeta(cells, player.opp, 1, -WIN_SCORE, WIN_SCORE, move)
+    return score, player.nodes
+
+
+# Returns the mark which has 3 in a row in the specified list of cells, or None if neither mark does.
+def winner(cells: [str]):
+    for a, b, c in WIN_LINES:
+        if cells[a] != ' ' and cells[a] == cells[b] == cells[c]:
+            return cells[a]
+    return None
+
 
-        # Return the object that represents the best move.
-        return moves[best_move]
+# Encodes the specified list of cells as a base-3 number, in which cell i is digit i.
+def encode(cells: [str]) -> int:
+    code = 0
+    for cell in reversed(cells):
+        code = 3 * code + CELL_CODES[cell]
+    return code
 
 
-# Iterates until an empty cell is found in the specified Board (pseudo-randomly) and returns its index.
-def check_rand(board: Board):
+# Encodes the specified list of cells as a base-3 number under each of the Board's symmetries and returns a tuple of the
+# smallest such code and the symmetry that produced it, so that positions which are rotations or reflections of each
+# other share a single code.
+def canonical(cells: [str]) -> (int, tuple):
+    best_code = None
+    best_perm = None
+    for perm in SYMMETRIES:
+        code = 0
+        for p in reversed(perm):
+            code = 3 * code + CELL_CODES[cells[p]]
+        if best_code is None or code < best_code:
+            best_code = code
+            best_perm = perm
+    return best_code, best_perm
+
+
+# Builds the opening book by enumerating every position which can be reached in a game on a 3x3 Board, storing the
+# perfect move for the player whose turn it is at the index of the position's base-3 code, and saves it to the file at
+# the specified path. The book is written to a temporary file next to it and then moved into place, so that processes
+# which have the book memory-mapped, or build it at the same time, never see a partly written file.
+def build_book(path: str):
+    book = bytearray([BOOK_NO_MOVE]) * 3 ** 9
+    searcher = Player(Player.PType.HARD, 'X')
+
+    # Walk the game tree depth-first, visiting every distinct position once.
+    stack = [([' '] * 9, 'X')]
+    seen = set()
+    while len(stack) > 0:
+        cells, turn_mark = stack.pop()
+        code = encode(cells)
+        if code in seen or winner(cells) is not None or ' ' not in cells:
+            continue
+        seen.add(code)
+
+        book[code] = searcher.search(cells, turn_mark)[1]
+        for i in range(9):
+            if cells[i] == ' ':
+                child = list(cells)
+                child[i] = turn_mark
+                stack.append((child, 'O' if turn_mark == 'X' else 'X'))
+
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(book)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+# Memory-maps the opening book from the file at the specified path, building it first if it does not exist.
+def load_book(path: str) -> mmap.mmap:
+    if not os.path.exists(path):
+        build_book(path)
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# Iterates until an empty cell is found in the specified Board (pseudo-randomly, using the specified random number
+# generator) and returns its index.
+def check_rand(board: Board, rng=random):
     while True:
-        idx = randrange(9)
+        idx = rng.randrange(len(board))
         if board[idx] == ' ':
             return idx
 
 
-# Iterates through all possible '3-in-a-row' locations of 3x3 Board in search of one where two cells contain the
-# specified mark and the third is empty. Returns the index (0 to 8) of that space, or -1 if no 1-turn win scenarios
+# Iterates through all possible 'k-in-a-row' locations of the Board in search of one where all but one of the cells
+# contain the specified mark and the last is empty. Returns the index of that space, or -1 if no 1-turn win scenarios
 # were found.
 def check_win_shallow(board: Board, mark):
-    n = 0
-    for r in board.rows():  # check Board rows for 1-turn win scenarios
-        if r.count(mark) == 2 and r.count(' '):
-            return r.index(' ') + n * board.n_cols
-        n += 1
-
-    n = 0
-    for c in board.cols():  # check Board cols for 1-turn win scenarios
-        if c.count(mark) == 2 and c.count(' '):
-            return c.index(' ') + n * board.n_rows
-        n += 1
-
-    d = [board[0], board[4], board[8]]  # check '\' diagonal
-    if d.count(mark) == 2 and d.count(' '):
-        return 4 * d.index(' ')
-
-    d = [board[6], board[4], board[2]]  # check '/' diagonal
-    if d.count(mark) == 2 and d.count(' '):
-        return 6 - 2 * d.index(' ')
+    for line in board.geometry.lines:
+        marks = [board[i] for i in line]
+        if marks.count(mark) == board.win_len - 1 and marks.count(' '):
+            return line[marks.index(' ')]
 
     return -1  # indicate lack of any 1-turn win scenarios
 
@@ -253,11 +731,19 @@ class Game:
         TURN_END = auto()
         COMPLETE = auto()
 
-    def __init__(self, p1_type, p2_type):
-        self.board = Board()
-        self.p1 = Player(p1_type, 'X')
-        self.p2 = Player(p2_type, 'O')
+    # Games are played on the specified board, or on an empty BitBoard if none was specified. Random moves are picked
+    # with the specified random number generator, and a Game which is not verbose prints nothing, so that it can be
+    # played headlessly.
+    def __init__(self, p1_type, p2_type, board=None, rng=random, verbose=True):
+        self.board = board if board is not None else BitBoard()
+        self.verbose = verbose
+        self.p1 = Player(p1_type, 'X', rng, verbose)
+        self.p2 = Player(p2_type, 'O', rng, verbose)
         self.current_player = self.p1
+
+        # The index of the last cell to be marked, and the final state of the Board once the Game is complete.
+        self.last_move = None
+        self.result = None
         self.__setstate__(self.State.TURN_START)
 
     # Update the Game's state attribute then proceed according to the specified state and the previous state.
@@ -271,9 +757,11 @@ class Game:
                 self.__setstate__(self.State.AWAIT_INDEX)
         elif state == self.State.TURN_END:
             # Print the current board.
-            self.board.print()
+            if self.verbose:
+                self.board.print()
 
-            if self.board.state() == 'incomplete':
+            # Only the last move can have completed the game, so only check around it.
+            if self.board.state(self.last_move) == 'incomplete':
                 # Swap the current player for the other player.
                 if self.current_player is self.p1:
                     self.current_player = self.p2
@@ -286,7 +774,10 @@ class Game:
                 self.__setstate__(self.State.COMPLETE)
         elif state == self.State.COMPLETE:
             # Determine the final board state and print the appropriate message based on the result.
-            final_board = self.board.state()
+            final_board = self.board.state(self.last_move)
+            self.result = final_board
+            if not self.verbose:
+                return
             if final_board == 'win_x':
                 print('X wins\n')
             elif final_board == 'win_o':
@@ -298,14 +789,142 @@ class Game:
     def move(self, index=-1):
         if self.state == self.State.TURN_START:
             # Calculate the position to mark if the current player is an AI.
-            self.board[self.current_player.calc_move(self.board)] = self.current_player.mark
+            self.last_move = self.current_player.calc_move(self.board)
+            self.board[self.last_move] = self.current_player.mark
             self.__setstate__(self.State.TURN_END)
         else:
             # Mark the specified index if the current player is a user.
+            self.last_move = index
             self.board[index] = self.current_player.mark
             self.__setstate__(self.State.TURN_END)
 
 
+# Plays a headless game between AI players of the specified types (by name) for each of the specified random seeds, on
+# Boards of the specified shape, and returns a Counter of the final states of the Boards.
+def play_games(p1_name: str, p2_name: str, seeds: [int], size=3, win_len=3) -> Counter:
+    results = Counter()
+    try:
+        for seed in seeds:
+            game = Game(Player.PType[p1_name.upper()], Player.PType[p2_name.upper()], BitBoard(size, size, win_len),
+                        random.Random(seed), verbose=False)
+            results[game.result] += 1
+    finally:
+        # Stop the processes of any searches split across processes, which would otherwise keep the worker process
+        # running this from exiting.
+        Player.shutdown_executor()
+    return results
+
+
+# Plays the specified number of headless games between AI players of the specified types (by name), spread across a pool
+# of the specified number of worker processes, and returns a mapping of the number of wins for X, wins for O and draws,
+# along with the time taken in seconds. Each game's random moves are seeded from the specified seed, so a
+# tournament's results are reproducible regardless of the number of workers.
+def run_tournament(p1_name: str, p2_name: str, n_games: int, workers=None, seed=0, size=3, win_len=3) \
+        -> Mapping[str, float]:
+    get_geometry(size, size, win_len)  # raises a ValueError before any games are played if the shape is invalid
+
+    # Build the opening book once, here, rather than in every worker that needs it. If it can't be saved, the workers
+    # make 'hard' moves instead.
+    if 'book' in (p1_name, p2_name) and not os.path.exists(BOOK_PATH):
+        try:
+            build_book(BOOK_PATH)
+        except OSError:
+            pass
+
+    master = random.Random(seed)
+    seeds = [master.getrandbits(64) for _ in range(n_games)]
+
+    # Split the games into a few chunks per worker, so that each task is large enough to be worth sending to a process.
+    workers = workers or os.cpu_count() or 1
+    chunk = max(1, n_games // (4 * workers))
+
+    start = perf_counter()
+    results = Counter()
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(play_games, p1_name, p2_name, seeds[i:i + chunk], size, win_len)
+                   for i in range(0, n_games, chunk)]
+        for future in futures:
+            results.update(future.result())
+
+    return {'win_x': results['win_x'], 'win_o': results['win_o'], 'draw': results['draw'],
+            'seconds': perf_counter() - start}
+
+
+# Times a single call of the specified function, returning the fastest of several repeated measurements in seconds, the
+# number of nodes the specified Player searched (if any) and the peak number of bytes allocated by the call.
+def measure(func, player=None, repeat=5) -> Mapping[str, float]:
+    # Run the function enough times per measurement for the measurement to take at least a millisecond.
+    number = 1
+    while True:
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = perf_counter() - start
+        if elapsed >= 0.001:
+            break
+        number *= 10
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (perf_counter() - start) / number)
+
+    # Measure allocations separately, since tracing them slows the function down.
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': best, 'nodes': player.nodes if player is not None else 0, 'bytes': peak}
+
+
+# Benchmarks the AI players and Board methods on each of the benchmark positions and returns a mapping of benchmark
+# names to their measurements. 'minimax' times a search with an empty transposition table, whereas 'hard' times a move
+# with the table already filled, as in a long-running process.
+def run_benchmarks(repeat=5) -> Mapping[str, Mapping[str, float]]:
+    results = {}
+    for name, position in BENCHMARK_POSITIONS.items():
+        board = BitBoard()
+        for i in range(9):
+            board[i] = position[i]
+        player = Player(Player.PType.HARD, 'X', random.Random(0), verbose=False)
+
+        def cold_minimax():
+            Player.transpositions.clear()
+            player.nodes = 0
+            player.minimax(board, 'X')
+
+        results[name + '/easy'] = measure(lambda: check_rand(board, player.rng), repeat=repeat)
+        results[name + '/medium'] = measure(lambda: player.calc_move_medium(board), repeat=repeat)
+        results[name + '/minimax'] = measure(cold_minimax, player, repeat)
+        results[name + '/hard'] = measure(lambda: player.calc_move_hard(board), player, repeat)
+        results[name + '/alphabeta'] = measure(lambda: player.calc_move_alphabeta(board), player, repeat)
+        results[name + '/state'] = measure(board.state, repeat=repeat)
+        results[name + '/check_win_shallow'] = measure(lambda: check_win_shallow(board, 'X'), repeat=repeat)
+    return results
+
+
+# Compares the specified benchmark results with those of the specified baseline, and returns a description of every
+# benchmark which searched more nodes or allocated more memory by more than the specified fraction. Timings vary from
+# run to run by far more than those, so they are only compared if a time threshold is specified, and then only for
+# benchmarks which take longer than the noise floor.
+def compare_benchmarks(results: Mapping, baseline: Mapping, threshold: float, time_threshold=None) -> [str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        limits = {'nodes': threshold, 'bytes': threshold}
+        if time_threshold is not None and baseline[name]['seconds'] >= BENCHMARK_NOISE_FLOOR:
+            limits['seconds'] = time_threshold
+        for key, limit in limits.items():
+            if result[key] > baseline[name][key] * (1 + limit):
+                regressions.append('{} {}: {:g} > {:g}'.format(name, key, result[key], baseline[name][key]))
+    return regressions
+
+
 # A finite state machine which controls the outer-most layer of program execution (i.e. starting a game, passing user
 # input to the game layer of the program, and exiting the program).
 class Menu:
@@ -361,34 +980,46 @@ class Menu:
     # as well as handles any user input.
     def command(self, cmd=None):
         if self.state == self.State.AWAIT_COMMAND:
-            # Process the command and update the Menu's state accordingly.
+            # Process the command and update the Menu's state accordingly. The size of the (square) board and the number
+            # of marks in a row needed to win may optionally follow the player types, and default to 3 and the size of
+            # the board respectively.
             splt_cmd = cmd.split()
             types = [t.lower() for t in Player.PType.__members__]
-            if splt_cmd[0] == 'start' and splt_cmd[1] in types and splt_cmd[2] in types and len(splt_cmd) == 3:
-                self.game = Game(Player.PType[splt_cmd[1].upper()], Player.PType[splt_cmd[2].upper()])
+            if splt_cmd[0] == 'start' and 3 <= len(splt_cmd) <= 5 and splt_cmd[1] in types and splt_cmd[2] in types \
+                    and all(n.isdigit() for n in splt_cmd[3:]):
+                size = int(splt_cmd[3]) if len(splt_cmd) > 3 else 3
+                win_len = int(splt_cmd[4]) if len(splt_cmd) > 4 else size
+                try:
+                    board = BitBoard(size, size, win_len)
+                except ValueError:
+                    print('Bad parameters!')
+                    self.__setstate__(self.State.AWAIT_COMMAND)
+                    return
+                self.game = Game(Player.PType[splt_cmd[1].upper()], Player.PType[splt_cmd[2].upper()], board)
                 self.__setstate__(self.State.TURN_START)
             elif cmd == 'exit':
-                self.__setstate__(menu.State.EXIT)
+                self.__setstate__(self.State.EXIT)
             else:
                 print('Bad parameters!')
                 self.__setstate__(self.State.AWAIT_COMMAND)
         elif self.state == self.State.AWAIT_COORDINATES:
             # Ensure that the user input consists only of digits.
             if all([c.isdigit() for c in cmd.split()]):
-                # Convert the coordinates to integers, ensure there are only 2, and ensure they are both in the range
-                # 0 < digit < 4.
+                # Convert the coordinates to integers, ensure there are only 2, and ensure they are both within the
+                # board.
+                board = self.game.board
                 coords = [int(i) for i in cmd.split()]  # convert the coordinates to digits
-                if len(coords) == 2 and 0 < coords[0] < 4 and 0 < coords[1] < 4:
-                    # Calculate the index (0 to 8 from left to right and top to bottom on the board) that the
+                if len(coords) == 2 and 0 < coords[0] <= board.n_cols and 0 < coords[1] <= board.n_rows:
+                    # Calculate the index (0 to n - 1 from left to right and top to bottom on the board) that the
                     # coordinates correspond to and ensure that the cell located at that index is empty.
-                    idx = 3 * (3 - coords[1]) + coords[0] - 1
+                    idx = board.n_cols * (board.n_rows - coords[1]) + coords[0] - 1
                     if self.game.board[idx] == ' ':
                         # Make the move and and end the turn.
                         self.game.move(idx)
                         self.__setstate__(self.State.TURN_END)
                         return
                 else:
-                    print('Coordinates should be from 1 to 3!')
+                    print('Coordinates should be from 1 to {}!'.format(max(board.n_rows, board.n_cols)))
             else:
                 print('You should enter numbers!')
 
@@ -396,10 +1027,64 @@ class Menu:
             self.__setstate__(self.State.AWAIT_COORDINATES)
 
 
-# Create a Menu and execute commands until it reaches the Menu.State.EXIT state.
-menu = Menu()
-while menu.state != menu.State.EXIT:
-    if menu.accept_input:
-        menu.command(input())
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Tic-Tac-Toe with AI')
+    arg_parser.add_argument('--build-book', metavar='PATH', nargs='?', const=BOOK_PATH,
+                            help='build the opening book of perfect 3x3 moves and exit')
+    ai_types = [t.lower() for t in Player.PType.__members__ if t != 'USER']
+    arg_parser.add_argument('--tournament', metavar=('P1', 'P2'), nargs=2, choices=ai_types,
+                            help='play headless games between two AI types ({}) and exit'.format(', '.join(ai_types)))
+    arg_parser.add_argument('--games', type=int, default=1000, help='number of tournament games (default: 1000)')
+    arg_parser.add_argument('--workers', type=int, help='number of tournament worker processes (default: all cores)')
+    arg_parser.add_argument('--seed', type=int, default=0, help='seed of the tournament random moves (default: 0)')
+    arg_parser.add_argument('--size', type=int, default=3, help='size of the tournament board (default: 3)')
+    arg_parser.add_argument('--win-len', type=int, help='marks in a row needed to win (default: the board size)')
+    arg_parser.add_argument('--search-workers', type=int, default=1,
+                            help='number of processes to split AI searches across (default: 1)')
+    arg_parser.add_argument('--benchmark', action='store_true', help='benchmark the AI players and exit')
+    arg_parser.add_argument('--baseline', metavar='PATH',
+                            help='JSON file of benchmark results to compare with (written if it does not exist)')
+    arg_parser.add_argument('--threshold', type=float, default=0.25,
+                            help='fraction by which nodes or bytes of a benchmark may regress before failing '
+                                 '(default: 0.25)')
+    arg_parser.add_argument('--time-threshold', type=float,
+                            help='fraction by which timings of {:g} s or more may regress before failing (default: '
+                                 'timings are not compared)'.format(BENCHMARK_NOISE_FLOOR))
+    args = arg_parser.parse_args()
+    Player.workers = args.search_workers
+
+    if args.build_book is not None:
+        build_book(args.build_book)
+    elif args.tournament is not None:
+        p1, p2 = args.tournament
+        try:
+            stats = run_tournament(p1, p2, args.games, args.workers, args.seed, args.size, args.win_len or args.size)
+        except ValueError as e:
+            arg_parser.error(str(e))
+        print('{} games of {} (X) vs {} (O) in {:.2f} s'.format(args.games, p1, p2, stats['seconds']))
+        print('X wins: {}, O wins: {}, draws: {}'.format(stats['win_x'], stats['win_o'], stats['draw']))
+    elif args.benchmark:
+        benchmarks = run_benchmarks()
+        for bench, measurements in benchmarks.items():
+            print('{:<28} {:>12.2f} us {:>8} nodes {:>10} bytes'.format(
+                bench, measurements['seconds'] * 1e6, measurements['nodes'], measurements['bytes']))
+
+        if args.baseline is not None:
+            if os.path.exists(args.baseline):
+                with open(args.baseline) as f:
+                    failures = compare_benchmarks(benchmarks, json.load(f), args.threshold, args.time_threshold)
+                for failure in failures:
+                    print('Regression:', failure)
+                if len(failures) > 0:
+                    exit(1)
+            else:
+                with open(args.baseline, 'w') as f:
+                    json.dump(benchmarks, f, indent=2)
     else:
-        menu.command()
+        # Create a Menu and execute commands until it reaches the Menu.State.EXIT state.
+        menu = Menu()
+        while menu.state != menu.State.EXIT:
+            if menu.accept_input:
+                menu.command(input())
+            else:
+                menu.command()
@@ -1,5 +1,12 @@
+import argparse
+import csv
+import os
 import random
 import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 
 # Finds the checksum of the specified 15-digit number
@@ -39,17 +46,42 @@ def gen_pin_num():
     return pin_num
 
 
+# The migrations of the database's schema, in order. The database's user_version records how many of them have been
+# applied, so that databases created by older versions of the BankSystem are upgraded in place when they are opened.
+MIGRATIONS = (
+    # 1: The card table.
+    '''CREATE TABLE IF NOT EXISTS card(
+       id INTEGER PRIMARY KEY,
+       number TEXT,
+       pin TEXT,
+       balance INTEGER DEFAULT 0)''',
+    # 2: An index for looking cards up by their number, which must be unique. Logging in looks the card up by its number
+    # too, then checks its PIN.
+    '''CREATE UNIQUE INDEX IF NOT EXISTS card_number ON card(number)''',
+)
+
+
+# The result code of SQLite operations which couldn't lock the database because another connection was using it.
+SQLITE_BUSY = 5
+
+
+# Returns whether the specified SQLite error was caused by another connection holding a lock on the database.
+def is_busy(error):
+    return getattr(error, 'sqlite_errorcode', None) == SQLITE_BUSY or 'database is locked' in str(error)
+
+
 class BankSystem:
-    def __init__(self, database):
-        # Initialize SQL components of the BankSystem with SQLite3.
-        self.connection = sqlite3.connect(database)
+    # The number of times a transfer is retried when the database stays locked by other connections for longer than the
+    # connection's timeout, and the delay before the first retry, which doubles with each retry.
+    busy_retries = 10
+    busy_delay = 0.01
+
+    def __init__(self, database, timeout=5.0):
+        # Initialize SQL components of the BankSystem with SQLite3, and bring the database's schema up to date. Waits
+        # for up to the specified number of seconds whenever another connection has the database locked.
+        self.connection = sqlite3.connect(database, timeout=timeout)
         self.cursor = self.connection.cursor()
-        self.cursor.executescript('''CREATE TABLE IF NOT EXISTS card(
-                                     id INTEGER PRIMARY KEY,
-                                     number TEXT,
-                                     pin TEXT,
-                                     balance INTEGER DEFAULT 0)''')
-        self.connection.commit()
+        self.migrate()
 
         # Initialize instance attributes.
         self.logged_in = False
@@ -57,6 +89,22 @@ class BankSystem:
         self.temp_card = None
         self.state = 'await_command'
 
+    # Applies the migrations which haven't been applied to the database yet, each in its own transaction along with the
+    # update of the database's version, then switches the database to write-ahead logging so that readers and a writer
+    # don't block each other.
+    def migrate(self):
+        self.cursor.execute('PRAGMA user_version')
+        version = self.cursor.fetchone()[0]
+        for i in range(version, len(MIGRATIONS)):
+            try:
+                self.cursor.executescript('BEGIN; {}; PRAGMA user_version = {}; COMMIT;'.format(MIGRATIONS[i], i + 1))
+            except sqlite3.Error:
+                if self.connection.in_transaction:
+                    self.connection.rollback()
+                raise
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.fetchone()
+
     def card_exists(self, number):
         self.cursor.execute('SELECT number FROM card WHERE number=:n', {'n': number})
         if self.cursor.fetchone() is not None:
@@ -83,6 +131,39 @@ class BankSystem:
         pin = gen_pin_num()
         self.create_card(number, pin)
 
+    # Issues the specified number of new cards with random PINs and returns them as a list of (number, PIN) tuples. Card
+    # numbers are generated in batches, which are checked against the existing cards with a single query each and then
+    # inserted with a single statement, all in one transaction, rather than with two queries and a commit per card.
+    # Raises a ValueError if the batch size isn't positive.
+    def issue_cards(self, count, batch_size=10000):
+        if batch_size < 1:
+            raise ValueError('The batch size must be positive.')
+
+        cards = []
+        self.cursor.execute('CREATE TEMP TABLE IF NOT EXISTS candidate(number TEXT PRIMARY KEY)')
+        try:
+            while len(cards) < count:
+                # Generate a batch of distinct candidate numbers.
+                batch = set()
+                while len(batch) < min(batch_size, count - len(cards)):
+                    batch.add(gen_card_num())
+
+                # Drop the candidates which are already in use.
+                self.cursor.execute('DELETE FROM candidate')
+                self.cursor.executemany('INSERT INTO candidate (number) VALUES (?)', [(n,) for n in batch])
+                self.cursor.execute('SELECT number FROM candidate WHERE number IN (SELECT number FROM card)')
+                batch.difference_update([row[0] for row in self.cursor.fetchall()])
+
+                new_cards = [(number, gen_pin_num()) for number in batch]
+                self.cursor.executemany('INSERT INTO card (number, pin) VALUES (?, ?)', new_cards)
+                cards.extend(new_cards)
+            self.cursor.execute('DELETE FROM candidate')
+            self.connection.commit()
+        except sqlite3.Error:
+            self.connection.rollback()
+            raise
+        return cards
+
     def login(self, pin):
         self.cursor.execute('SELECT id FROM card WHERE number=:n AND pin=:p', {'n': self.temp_card, 'p': pin})
         account = self.cursor.fetchone()
@@ -104,20 +185,48 @@ class BankSystem:
         self.connection.commit()
         print('Income was added!')
 
+    # Moves the specified amount of money from the account with the specified id to the card with the specified number,
+    # and returns whether the account had enough money. Both updates happen in a single transaction which locks the
+    # database for writing before reading anything, and the account is only debited if its balance covers the amount at
+    # that point, so concurrent transfers can never overdraw it. Raises a ValueError if the card doesn't exist, in which
+    # case nothing changes. If other connections keep the database locked, the transfer is retried after a delay.
+    def transfer(self, account_id, number, amount):
+        for attempt in range(self.busy_retries + 1):
+            try:
+                self.cursor.execute('BEGIN IMMEDIATE')
+                self.cursor.execute('''UPDATE card
+                                       SET balance=balance-:amount
+                                       WHERE id=:id AND balance>=:amount''',
+                                    {'amount': amount, 'id': account_id})
+                if self.cursor.rowcount == 0:
+                    self.connection.rollback()
+                    return False
+                self.cursor.execute('''UPDATE card
+                                       SET balance=balance+:amount
+                                       WHERE number=:number''',
+                                    {'amount': amount, 'number': number})
+                if self.cursor.rowcount == 0:
+                    self.connection.rollback()
+                    raise ValueError('Such a card does not exist.')
+                self.connection.commit()
+                return True
+            except sqlite3.OperationalError as e:
+                if self.connection.in_transaction:
+                    self.connection.rollback()
+                if not is_busy(e) or attempt == self.busy_retries:
+                    raise
+
+                # Back off for a random time, so that competing transfers don't keep colliding.
+                time.sleep(random.uniform(0, self.busy_delay * 2 ** attempt))
+
     def do_transfer(self, amount):
-        if self.balance() >= amount:
-            self.cursor.execute('''UPDATE card
-                                   SET balance=balance-:amount 
-                                   WHERE id=:id''',
-                                {'amount': amount, 'id': self.account_id})
-            self.cursor.execute('''UPDATE card
-                                   SET balance=balance+:amount 
-                                   WHERE number=:number''',
-                                {'amount': amount, 'number': self.temp_card})
-            self.connection.commit()
-            print('Success!')
-        else:
-            print('Not enough money!')
+        try:
+            if self.transfer(self.account_id, self.temp_card, amount):
+                print('Success!')
+            else:
+                print('Not enough money!')
+        except ValueError as e:
+            print(e)
 
     def close_account(self):
         self.cursor.execute('DELETE FROM card WHERE id=:id', {'id': self.account_id})
@@ -185,25 +294,114 @@ class BankSystem:
             self.state = 'shutdown'
 
 
-# Initialize the BankSystem and allow the user to execute commands until the system enters the 'shutdown' state.
-sys = BankSystem('card.s3db')
-while sys.state != 'shutdown':
-    # Prompt the user to enter their command.
-    if sys.state == 'await_command':
-        if sys.logged_in:
-            print('1. Balance')
-            print('2. Add income')
-            print('3. Do transfer')
-            print('4. Close account')
-            print('5. Log out')
-            print('0. Exit')
+# Runs the specified number of transfers of random amounts between random cards of the database at the specified path,
+# and returns the numbers of transfers which succeeded and which were refused for lack of money.
+def run_transfers(database, count, seed):
+    rng = random.Random(seed)
+    bank = BankSystem(database)
+    bank.cursor.execute('SELECT id, number FROM card')
+    cards = bank.cursor.fetchall()
+
+    done = 0
+    refused = 0
+    for _ in range(count):
+        (account_id, _), (_, number) = rng.sample(cards, 2)
+        if bank.transfer(account_id, number, rng.randint(1, 150)):
+            done += 1
         else:
-            print('1. Create an account')
-            print('2. Log into account')
-            print('0. Exit')
+            refused += 1
+    bank.connection.close()
+    return done, refused
+
+
+# Runs the specified number of transfers between the specified number of cards, each starting with the specified
+# balance, split between the specified number of processes, each with its own connection to a new database. Prints a
+# summary and returns whether money was conserved, i.e. whether the total balance is unchanged and no card is overdrawn.
+def stress_test(transfers, processes, accounts, balance=100):
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, 'stress.s3db')
+        bank = BankSystem(database)
+        bank.issue_cards(accounts)
+        bank.cursor.execute('UPDATE card SET balance=:balance', {'balance': balance})
+        bank.connection.commit()
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(processes) as executor:
+            chunks = [transfers // processes + (1 if i < transfers % processes else 0) for i in range(processes)]
+            results = list(executor.map(run_transfers, [database] * processes, chunks, range(processes)))
+        elapsed = time.perf_counter() - start
+
+        bank.cursor.execute('SELECT SUM(balance), MIN(balance) FROM card')
+        total, lowest = bank.cursor.fetchone()
+        bank.connection.close()
+
+    done = sum([r[0] for r in results])
+    refused = sum([r[1] for r in results])
+    conserved = total == accounts * balance and lowest >= 0
+    print('{} transfers ({} done, {} refused) by {} processes in {:.3f} s'.format(
+        transfers, done, refused, processes, elapsed))
+    print('Total balance: {} (expected {}), lowest balance: {}: {}'.format(
+        total, accounts * balance, lowest, 'OK' if conserved else 'FAILED'))
+    return conserved
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Simple Banking System')
+    arg_parser.add_argument('--database', default='card.s3db', help='SQLite database file (default: card.s3db)')
+    arg_parser.add_argument('--issue', type=int, metavar='COUNT', help='issue COUNT new cards at once and exit')
+    arg_parser.add_argument('--batch-size', type=int, default=10000,
+                            help='cards generated and inserted per batch when issuing cards (default: 10000)')
+    arg_parser.add_argument('--output', metavar='FILE',
+                            help='CSV file to write the numbers and PINs of issued cards to (default: standard output)')
+    arg_parser.add_argument('--stress', type=int, metavar='TRANSFERS',
+                            help='run TRANSFERS concurrent transfers on a temporary database, check that money is '
+                                 'conserved and exit')
+    arg_parser.add_argument('--processes', type=int, default=4,
+                            help='processes running transfers concurrently for --stress (default: 4)')
+    arg_parser.add_argument('--accounts', type=int, default=20, help='cards transferred between for --stress '
+                                                                     '(default: 20)')
+    args = arg_parser.parse_args()
+    if args.batch_size < 1:
+        arg_parser.error('--batch-size must be positive')
+
+    if args.stress is not None:
+        sys.exit(0 if stress_test(args.stress, args.processes, args.accounts) else 1)
+
+    # Initialize the BankSystem.
+    bank = BankSystem(args.database)
+
+    if args.issue is not None:
+        # Issue the cards in bulk, write out their numbers and PINs, which are needed to log into them, and report how
+        # quickly they were issued.
+        start = time.perf_counter()
+        issued = bank.issue_cards(args.issue, args.batch_size)
+        elapsed = time.perf_counter() - start
+
+        output = sys.stdout if args.output is None else open(args.output, 'w', newline='')
+        with output:
+            writer = csv.writer(output)
+            writer.writerow(('number', 'pin'))
+            writer.writerows(issued)
+        print('Issued {} cards in {:.3f} s'.format(len(issued), elapsed), file=sys.stderr)
+    else:
+        # Allow the user to execute commands until the system enters the 'shutdown' state.
+        while bank.state != 'shutdown':
+            # Prompt the user to enter their command.
+            if bank.state == 'await_command':
+                if bank.logged_in:
+                    print('1. Balance')
+                    print('2. Add income')
+                    print('3. Do transfer')
+                    print('4. Close account')
+                    print('5. Log out')
+                    print('0. Exit')
+                else:
+                    print('1. Create an account')
+                    print('2. Log into account')
+                    print('0. Exit')
 
-    # Execute the command
-    sys.command(input())
+            # Execute the command
+            bank.command(input())
 
-# Print a final message before exiting the program.
-print('Bye!')
+        # Print a final message before exiting the program.
+        print('Bye!')
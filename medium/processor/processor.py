@@ -1,4 +1,26 @@
-from math import pow
+import argparse
+import json
+import mmap
+import operator
+import random
+import struct
+import sys
+import tracemalloc
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from math import fsum, pow
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Determinants and inverses of square matrices up to this size are calculated by cofactor expansion, which is still
+# quick at this size and exact for whole numbers, and those of larger ones from their LU decomposition.
+COFACTOR_SIZE = 7
 
 
 def dot_product(row, col):  # calculate dot product of two vectors
@@ -34,6 +56,177 @@ def calc_determinant(matrix):  # recursively calculate a matrix's determinant
         return expanded_sum
 
 
+def lu_decompose(matrix, tolerance=0.0):  # factor a square matrix as P*A = L*U, using partial pivoting
+    # Work on a copy of the rows. L (below the diagonal, with an implicit unit diagonal) and U (on and above it) are
+    # stored together in the copy, and perm records which row of the matrix ended up in each row.
+    lu = [list(row) for row in matrix]
+    n = len(lu)
+    perm = list(range(n))
+    sign = 1.0
+
+    # Pivots whose size relative to the largest cell is within the tolerance are treated as zero.
+    limit = tolerance * max([abs(v) for row in lu for v in row], default=0.0)
+    for k in range(n):
+        # Swap the row with the largest value in the current column into the pivot position, which keeps the
+        # multipliers at most 1 in size and the rounding errors small.
+        p = max(range(k, n), key=lambda r: abs(lu[r][k]))
+        if abs(lu[p][k]) <= limit:
+            return None
+        if p != k:
+            lu[k], lu[p] = lu[p], lu[k]
+            perm[k], perm[p] = perm[p], perm[k]
+            sign = -sign
+
+        # Eliminate the column below the pivot, storing the multipliers in its place.
+        pivot_row = lu[k]
+        pivot = pivot_row[k]
+        for r in range(k + 1, n):
+            row = lu[r]
+            factor = row[k] / pivot
+            row[k] = factor
+            if factor != 0.0:
+                for c in range(k + 1, n):
+                    row[c] -= factor * pivot_row[c]
+    return lu, perm, sign
+
+
+def lu_solve(lu, perm, b):  # solve A*x = b for x, given the LU decomposition of A
+    n = len(lu)
+
+    # Solve L*y = P*b by forward substitution, then U*x = y by back substitution.
+    y = [0.0] * n
+    for i in range(n):
+        row = lu[i]
+        y[i] = b[perm[i]] - sum([row[j] * y[j] for j in range(i)])
+    x = [0.0] * n
+    for i in range(n - 1, -1, -1):
+        row = lu[i]
+        x[i] = (y[i] - sum([row[j] * x[j] for j in range(i + 1, n)])) / row[i]
+    return x
+
+
+def lu_decompose_array(a, tolerance=0.0):  # lu_decompose for a NumPy array, eliminating a whole column at a time
+    lu = numpy.array(a, dtype=numpy.float64)
+    n = lu.shape[0]
+    perm = numpy.arange(n)
+    sign = 1.0
+
+    limit = tolerance * (float(numpy.abs(lu).max()) if lu.size > 0 else 0.0)
+    for k in range(n):
+        p = k + int(numpy.argmax(numpy.abs(lu[k:, k])))
+        if abs(lu[p, k]) <= limit:
+            return None
+        if p != k:
+            lu[[k, p]] = lu[[p, k]]
+            perm[[k, p]] = perm[[p, k]]
+            sign = -sign
+
+        # Store the multipliers below the pivot, then subtract their multiples of the pivot row from the rows below it.
+        lu[k + 1:, k] /= lu[k, k]
+        lu[k + 1:, k + 1:] -= numpy.outer(lu[k + 1:, k], lu[k, k + 1:])
+    return lu, perm, sign
+
+
+def lu_solve_array(lu, perm, b):  # lu_solve for a NumPy array, solving for every column of b at once
+    x = numpy.array(b, dtype=numpy.float64)[perm]
+    n = lu.shape[0]
+    for i in range(n):
+        x[i] -= lu[i, :i] @ x[:i]
+    for i in range(n - 1, -1, -1):
+        x[i] = (x[i] - lu[i, i + 1:] @ x[i + 1:]) / lu[i, i]
+    return x
+
+
+# The number of rows and columns of the tiles that blocked products are split into. A tile of each operand fits in the
+# CPU cache together with a tile of the result.
+BLOCK_SIZE = 64
+
+
+def share_matrix(matrix):  # copy a matrix's cells into a new block of shared memory as float64 values, row by row
+    shm = SharedMemory(create=True, size=max(8 * matrix.n_rows * matrix.n_cols, 8))
+    if numpy is not None:
+        cells = numpy.ndarray((matrix.n_rows, matrix.n_cols), dtype=numpy.float64, buffer=shm.buf)
+        cells[:] = matrix.data if isinstance(matrix, ArrayMatrix) else matrix.cells
+        del cells
+    else:
+        view = shm.buf.cast('d')
+        for r in range(matrix.n_rows):
+            view[r * matrix.n_cols:(r + 1) * matrix.n_cols] = array('d', matrix.get_row(r))
+        view.release()
+    return shm
+
+
+def multiply_tiles(names, n, m, p, tiles, block):  # calculate tiles of the product of two matrices in shared memory
+    # Attach to the n*m and m*p operands and the n*p result, given the names of their blocks of shared memory.
+    shms = [SharedMemory(name=name) for name in names]
+    try:
+        if numpy is not None:
+            a = numpy.ndarray((n, m), dtype=numpy.float64, buffer=shms[0].buf)
+            b = numpy.ndarray((m, p), dtype=numpy.float64, buffer=shms[1].buf)
+            c = numpy.ndarray((n, p), dtype=numpy.float64, buffer=shms[2].buf)
+            for i0, j0 in tiles:
+                c[i0:i0 + block, j0:j0 + block] = a[i0:i0 + block] @ b[:, j0:j0 + block]
+            del a, b, c
+        else:
+            a, b, c = [shm.buf.cast('d') for shm in shms]
+            for i0, j0 in tiles:
+                i1 = min(i0 + block, n)
+                j1 = min(j0 + block, p)
+                tile = [[0.0] * (j1 - j0) for _ in range(i1 - i0)]
+
+                # Add up the products of the tiles of the operands along the shared dimension, copying the columns of
+                # each tile of the second operand once.
+                for k0 in range(0, m, block):
+                    k1 = min(k0 + block, m)
+                    cols = [b[k0 * p + j:k1 * p:p].tolist() for j in range(j0, j1)]
+                    for i in range(i0, i1):
+                        row = a[i * m + k0:i * m + k1].tolist()
+                        sums = tile[i - i0]
+                        for j, col in enumerate(cols):
+                            sums[j] += sum(map(operator.mul, row, col))
+
+                for i in range(i0, i1):
+                    c[i * p + j0:i * p + j1] = array('d', tile[i - i0])
+            for view in (a, b, c):
+                view.release()
+    finally:
+        for shm in shms:
+            shm.close()
+
+
+# Calculates the product of two matrices a tile at a time, splitting the tiles between the specified number of worker
+# processes (or calculating them in this process if there is only one). The operands and the result are kept in shared
+# memory, so only the names of the blocks of memory and the positions of the tiles are sent to the workers. Returns the
+# cells of the product as a 2D NumPy array when NumPy is installed, or as a flat array('d') otherwise.
+def mult_blocked(a, b, workers=1, block=BLOCK_SIZE):
+    n, m, p = a.n_rows, a.n_cols, b.n_cols
+    shms = [share_matrix(a), share_matrix(b), SharedMemory(create=True, size=max(8 * n * p, 8))]
+    try:
+        names = [shm.name for shm in shms]
+        tiles = [(i0, j0) for i0 in range(0, n, block) for j0 in range(0, p, block)]
+        if workers <= 1:
+            multiply_tiles(names, n, m, p, tiles, block)
+        else:
+            # Deal the tiles out in turn, so that each worker gets tiles from across the whole result.
+            with ProcessPoolExecutor(workers) as executor:
+                futures = [executor.submit(multiply_tiles, names, n, m, p, tiles[w::workers], block)
+                           for w in range(workers)]
+                for future in futures:
+                    future.result()
+
+        # Copy the product out of shared memory before releasing it.
+        if numpy is not None:
+            return numpy.ndarray((n, p), dtype=numpy.float64, buffer=shms[2].buf).copy()
+        view = shms[2].buf.cast('d')
+        product = array('d', view[:n * p])
+        view.release()
+        return product
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+
 class Matrix:
     def __init__(self, n_rows, n_cols, rows):
         self.n_rows = n_rows
@@ -70,9 +263,10 @@ class Matrix:
         if self.n_rows != other.n_rows or self.n_cols != other.n_cols:
             return False
         else:
+            other_cells = other.cells
             for i in range(self.n_rows):
                 for j in range(self.n_cols):
-                    self.cells[i][j] += other.cells[i][j]
+                    self.cells[i][j] += other_cells[i][j]
             return True
 
     def mult_scalar(self, scalar):
@@ -80,9 +274,19 @@ class Matrix:
             for j in range(self.n_cols):
                 self.cells[i][j] *= scalar
 
-    def mult_matrix(self, other):
+    # Multiplies the matrix by another one. With any workers, the product is calculated a tile at a time by
+    # mult_blocked, with that many processes.
+    def mult_matrix(self, other, workers=0, block=BLOCK_SIZE):
         if self.n_cols != other.n_rows:
             return False
+        elif workers > 0:
+            data = mult_blocked(self, other, workers, block)
+            self.n_cols = other.n_cols
+            if numpy is not None:
+                self.set_cells(data.tolist())
+            else:
+                self.set_cells([data[i * self.n_cols:(i + 1) * self.n_cols] for i in range(self.n_rows)])
+            return True
         else:
             self.n_cols = other.n_cols
 
@@ -126,12 +330,52 @@ class Matrix:
             return False
         return True
 
+    def copy(self):  # return a new matrix of the same type with the same cells
+        return type(self)(self.n_rows, self.n_cols, self.cells)
+
+    # Returns the solution x of A*x = b, where A is this matrix and b is another one with a column for each right-hand
+    # side, by forward and back substitution with the LU decomposition of A rather than by calculating its inverse.
+    # Returns None if A isn't square, b has the wrong number of rows, or A is singular (within the relative tolerance).
+    def solve(self, b, tolerance=1e-12):
+        if self.n_rows != self.n_cols or self.n_rows == 0 or b.n_rows != self.n_rows:
+            return None
+        decomposition = lu_decompose(self.cells, tolerance)
+        if decomposition is None:
+            return None
+        lu, perm, sign = decomposition
+
+        cols = [lu_solve(lu, perm, b.get_col(j)) for j in range(b.n_cols)]
+        x = type(self)(b.n_cols, self.n_rows, cols)
+        x.transpose('main')
+        return x
+
     def determinant(self):
-        return calc_determinant(self.cells)
+        # Small determinants are calculated by cofactor expansion, which is exact for whole numbers. Larger ones are the
+        # product of the pivots of the matrix's LU decomposition.
+        if self.n_rows <= COFACTOR_SIZE or self.n_rows != self.n_cols:
+            return calc_determinant(self.cells)
 
-    def inverse(self):
-        if 2 < self.n_rows == self.n_cols > 2:
-            # Find the matrix's cofactors.
+        decomposition = lu_decompose(self.cells)
+        if decomposition is None:
+            return 0.0
+        lu, perm, sign = decomposition
+        for i in range(self.n_rows):
+            sign *= lu[i][i]
+        return sign
+
+    # Replaces the matrix with its inverse. Large inverses are calculated one column at a time from the matrix's LU
+    # decomposition, and the matrix is treated as singular if any pivot is within the relative tolerance of zero. Each
+    # refinement step solves for the error left in the inverse (calculated with extended precision sums) and corrects
+    # it, for ill-conditioned matrices.
+    def inverse(self, tolerance=1e-12, refine=0):
+        if self.n_rows != self.n_cols or self.n_rows == 0:
+            return False
+
+        if 2 <= self.n_rows <= COFACTOR_SIZE:
+            # Small inverses are calculated from the matrix's cofactors, which are exact for whole numbers.
+            determinant = self.determinant()
+            if determinant == 0:
+                return False
             cofactors = []
             for i in range(self.n_rows):
                 row = []
@@ -139,17 +383,376 @@ class Matrix:
                     row.append(pow(-1, i + j) * calc_determinant(minor(self.cells, i + 1, j + 1)))
                 cofactors.append(row)
 
-            # Calculate the determinant of the matrix, transpose its cofactors, then calculate the inverse.
-            determinant = self.determinant()
+            # Transpose the cofactors, then divide them by the determinant to calculate the inverse.
             self.set_cells(cofactors)
             self.transpose('main')
             self.mult_scalar(1 / determinant)
+            return True
+
+        cells = self.cells
+        decomposition = lu_decompose(cells, tolerance)
+        if decomposition is None:
+            return False
+        lu, perm, sign = decomposition
+
+        n = self.n_rows
+        cols = []
+        for j in range(n):
+            unit = [0.0] * n
+            unit[j] = 1.0
+            x = lu_solve(lu, perm, unit)
+            for _ in range(refine):
+                residual = [unit[i] - fsum([a * b for a, b in zip(cells[i], x)]) for i in range(n)]
+                x = [a + b for a, b in zip(x, lu_solve(lu, perm, residual))]
+            cols.append(x)
+
+        # The solutions are the columns of the inverse.
+        self.set_cells(cols)
+        self.transpose('main')
+        return True
+
+
+# A Matrix whose cells are stored in a single contiguous buffer of float64 values: a 2D NumPy array when NumPy is
+# installed, or a flat array('d') of the rows one after another otherwise. Operations work on the whole buffer at once
+# (with BLAS for products when NumPy is available), and with NumPy, transposes are views of the same buffer rather than
+# copies.
+class ArrayMatrix(Matrix):
+    def __init__(self, n_rows, n_cols, rows):
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.data = None
+        self.set_cells(rows)
+
+    def __str__(self):
+        return ''.join(' '.join([str(n) for n in row]) + '\n' for row in self.cells)
+
+    @property
+    def cells(self):  # the rows of the matrix as lists, for the operations shared with Matrix
+        if numpy is not None:
+            return self.data.tolist()
+        return [self.get_row(r) for r in range(self.n_rows)]
+
+    @staticmethod
+    def from_data(n_rows, n_cols, data):  # wrap a 2D NumPy array or a flat array('d') in an ArrayMatrix without copying
+        matrix = ArrayMatrix.__new__(ArrayMatrix)
+        matrix.n_rows = n_rows
+        matrix.n_cols = n_cols
+        matrix.data = data
+        return matrix
+
+    @staticmethod
+    def of(matrix):  # return the specified matrix as an ArrayMatrix, copying it only if it isn't one already
+        if isinstance(matrix, ArrayMatrix):
+            return matrix
+        return ArrayMatrix(matrix.n_rows, matrix.n_cols, matrix.cells)
+
+    def get_row(self, r):
+        if numpy is not None:
+            return self.data[r].tolist()
+        return self.data[r * self.n_cols:(r + 1) * self.n_cols].tolist()
+
+    def get_col(self, c):
+        if numpy is not None:
+            return self.data[:, c].tolist()
+        return self.data[c::self.n_cols].tolist()
+
+    def set_cells(self, rows):
+        if numpy is not None:
+            self.data = numpy.array(rows, dtype=numpy.float64).reshape(self.n_rows, self.n_cols)
+        else:
+            self.data = array('d', [float(i) for row in rows for i in row])
+
+    def add_matrix(self, other):
+        if self.n_rows != other.n_rows or self.n_cols != other.n_cols:
+            return False
+        else:
+            other = ArrayMatrix.of(other)
+            if numpy is not None:
+                self.data = self.data + other.data
+            else:
+                self.data = array('d', map(operator.add, self.data, other.data))
+            return True
+
+    def mult_scalar(self, scalar):
+        if numpy is not None:
+            self.data = self.data * scalar
+        else:
+            self.data = array('d', map(operator.mul, self.data, repeat(scalar)))
+
+    def mult_matrix(self, other, workers=0, block=BLOCK_SIZE):
+        if self.n_cols != other.n_rows:
+            return False
+        else:
+            other = ArrayMatrix.of(other)
+            if workers > 0:
+                self.data = mult_blocked(self, other, workers, block)
+            elif numpy is not None:
+                self.data = self.data @ other.data
+            else:
+                # Copy each column of the other matrix once, rather than once per cell of the product.
+                cols = [other.data[c::other.n_cols] for c in range(other.n_cols)]
+                data = array('d')
+                for i in range(self.n_rows):
+                    row = self.data[i * self.n_cols:(i + 1) * self.n_cols]
+                    data.extend([sum(map(operator.mul, row, col)) for col in cols])
+                self.data = data
+            self.n_cols = other.n_cols
+            return True
+
+    def transpose(self, t_type):
+        if numpy is not None:
+            # Each transpose is a view of the same buffer with different strides.
+            if t_type == 'main':
+                self.data = self.data.T
+            elif t_type == 'side':
+                self.data = self.data[::-1, ::-1].T
+            elif t_type == 'vertical':
+                self.data = self.data[:, ::-1]
+            elif t_type == 'horizontal':
+                self.data = self.data[::-1]
+            else:
+                return False
         else:
+            n = self.n_cols
+            data = array('d')
+            if t_type == 'main':
+                # The rows of the result are the columns of the matrix.
+                for c in range(n):
+                    data.extend(self.data[c::n])
+            elif t_type == 'side':
+                # The rows of the result are the columns of the matrix from last to first, each reversed.
+                for c in range(n - 1, -1, -1):
+                    col = self.data[c::n]
+                    col.reverse()
+                    data.extend(col)
+            elif t_type == 'vertical':
+                for r in range(self.n_rows):
+                    row = self.data[r * n:(r + 1) * n]
+                    row.reverse()
+                    data.extend(row)
+            elif t_type == 'horizontal':
+                for r in range(self.n_rows - 1, -1, -1):
+                    data.extend(self.data[r * n:(r + 1) * n])
+            else:
+                return False
+            self.data = data
+
+        if t_type in ('main', 'side'):
+            self.swap_dimensions()
+        return True
+
+    def copy(self):
+        if numpy is not None:
+            return ArrayMatrix.from_data(self.n_rows, self.n_cols, self.data.copy())
+        return ArrayMatrix.from_data(self.n_rows, self.n_cols, array('d', self.data))
+
+    def solve(self, b, tolerance=1e-12):
+        if numpy is None:
+            return super().solve(b, tolerance)
+        if self.n_rows != self.n_cols or self.n_rows == 0 or b.n_rows != self.n_rows:
+            return None
+        decomposition = lu_decompose_array(self.data, tolerance)
+        if decomposition is None:
+            return None
+        lu, perm, sign = decomposition
+        return ArrayMatrix.from_data(b.n_rows, b.n_cols, lu_solve_array(lu, perm, ArrayMatrix.of(b).data))
+
+    def determinant(self):
+        if numpy is None or self.n_rows <= COFACTOR_SIZE or self.n_rows != self.n_cols:
+            return super().determinant()
+
+        decomposition = lu_decompose_array(self.data)
+        if decomposition is None:
+            return 0.0
+        lu, perm, sign = decomposition
+        return sign * float(numpy.prod(numpy.diagonal(lu)))
+
+    def inverse(self, tolerance=1e-12, refine=0):
+        if numpy is None or self.n_rows <= COFACTOR_SIZE:
+            return super().inverse(tolerance, refine)
+        if self.n_rows != self.n_cols or self.n_rows == 0:
             return False
+
+        decomposition = lu_decompose_array(self.data, tolerance)
+        if decomposition is None:
+            return False
+        lu, perm, sign = decomposition
+
+        # Solve for every column of the identity matrix at once, then correct the remaining error.
+        identity = numpy.eye(self.n_rows)
+        x = lu_solve_array(lu, perm, identity)
+        for _ in range(refine):
+            x += lu_solve_array(lu, perm, identity - self.data @ x)
+        self.data = x
         return True
 
 
-def read_matrix(ordinal=''):
+# A Matrix which only stores its non-zero cells, in a dictionary for each row mapping column indices to values, so that
+# its memory use and the time taken by its operations grow with the number of non-zero cells rather than with the
+# matrix's size.
+class SparseMatrix(Matrix):
+    def __init__(self, n_rows, n_cols, rows):
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.rows = []
+        self.set_cells(rows)
+
+    def __str__(self):
+        return ''.join(' '.join([str(n) for n in self.get_row(r)]) + '\n' for r in range(self.n_rows))
+
+    @property
+    def cells(self):  # the rows of the matrix as lists, for the operations shared with Matrix
+        return [self.get_row(r) for r in range(self.n_rows)]
+
+    def copy(self):
+        matrix = SparseMatrix(self.n_rows, self.n_cols, [])
+        matrix.rows = [dict(row) for row in self.rows]
+        return matrix
+
+    def nonzero(self):  # the number of non-zero cells of the matrix
+        return sum([len(row) for row in self.rows])
+
+    def get_row(self, r):
+        row = [0.0] * self.n_cols
+        for c, v in self.rows[r].items():
+            row[c] = v
+        return row
+
+    def get_col(self, c):
+        return [row.get(c, 0.0) for row in self.rows]
+
+    def set_cells(self, rows):
+        self.rows = []
+        for row in rows:
+            values = {}
+            for c, v in enumerate(row):
+                v = float(v)
+                if v != 0.0:
+                    values[c] = v
+            self.rows.append(values)
+
+    def add_matrix(self, other):
+        if self.n_rows != other.n_rows or self.n_cols != other.n_cols:
+            return False
+        else:
+            for row, other_row in zip(self.rows, sparse_rows(other)):
+                for c, v in other_row.items():
+                    v += row.get(c, 0.0)
+                    if v != 0.0:
+                        row[c] = v
+                    else:
+                        row.pop(c, None)
+            return True
+
+    def mult_scalar(self, scalar):
+        if scalar == 0:
+            self.rows = [{} for _ in range(self.n_rows)]
+        else:
+            self.rows = [{c: v * scalar for c, v in row.items()} for row in self.rows]
+
+    def mult_matrix(self, other, workers=0, block=BLOCK_SIZE):
+        if self.n_cols != other.n_rows:
+            return False
+        else:
+            # Each row of the product is the sum of the rows of the other matrix, scaled by the non-zero cells of the
+            # corresponding row of this one. Sparse products only visit non-zero cells, so they are never blocked.
+            other_rows = sparse_rows(other)
+            rows = []
+            for row in self.rows:
+                product = {}
+                for k, a in row.items():
+                    for c, b in other_rows[k].items():
+                        product[c] = product.get(c, 0.0) + a * b
+                rows.append({c: v for c, v in product.items() if v != 0.0})
+            self.rows = rows
+            self.n_cols = other.n_cols
+            return True
+
+    # Each transpose reverses the order of the rows and/or the columns, then swaps rows with columns or not.
+    transposes = {'main': (False, False, True), 'side': (True, True, True),
+                  'vertical': (False, True, False), 'horizontal': (True, False, False)}
+
+    def transpose(self, t_type):
+        if t_type not in self.transposes:
+            return False
+        flip_rows, flip_cols, swap = self.transposes[t_type]
+
+        # Move every non-zero cell to its new position.
+        n_rows, n_cols = self.n_rows, self.n_cols
+        rows = [{} for _ in range(n_cols if swap else n_rows)]
+        for r, row in enumerate(self.rows):
+            if flip_rows:
+                r = n_rows - r - 1
+            for c, v in row.items():
+                if flip_cols:
+                    c = n_cols - c - 1
+                if swap:
+                    rows[c][r] = v
+                else:
+                    rows[r][c] = v
+        self.rows = rows
+        if swap:
+            self.swap_dimensions()
+        return True
+
+    def determinant(self):
+        if self.n_rows <= COFACTOR_SIZE or self.n_rows != self.n_cols:
+            return super().determinant()
+
+        # Eliminate the matrix column by column, like lu_decompose, but only visiting the non-zero cells of each row.
+        rows = [dict(row) for row in self.rows]
+        determinant = 1.0
+        for k in range(self.n_rows):
+            candidates = [r for r in range(k, self.n_rows) if rows[r].get(k, 0.0) != 0.0]
+            if len(candidates) == 0:
+                return 0.0
+
+            # Rather than always pivoting on the largest value, pivot on the shortest row among those with values at
+            # least a tenth the size of the largest one. This keeps the rounding errors in check while filling in as
+            # few zeros as possible.
+            largest = max([abs(rows[r][k]) for r in candidates])
+            p = min([r for r in candidates if abs(rows[r][k]) >= 0.1 * largest], key=lambda r: len(rows[r]))
+            pivot = rows[p][k]
+            if p != k:
+                rows[k], rows[p] = rows[p], rows[k]
+                determinant = -determinant
+            determinant *= pivot
+
+            pivot_row = rows[k]
+            for r in range(k + 1, self.n_rows):
+                row = rows[r]
+                if k in row:
+                    factor = row.pop(k) / pivot
+                    for c, v in pivot_row.items():
+                        if c > k:
+                            row[c] = row.get(c, 0.0) - factor * v
+        return determinant
+
+
+def sparse_rows(matrix):  # the non-zero cells of any kind of matrix, as a dictionary for each row
+    if isinstance(matrix, SparseMatrix):
+        return matrix.rows
+    return [{c: v for c, v in enumerate(row) if v != 0.0} for row in matrix.cells]
+
+
+# The suggested largest fraction of non-zero cells for which matrices read by read_matrix are stored as SparseMatrix
+# objects, and the smallest number of cells a matrix must have for it to be worth it. Sparse storage is opt-in, since
+# sparse matrices don't store the sign of zero cells, so they print 0.0 where a Matrix would print -0.0.
+SPARSE_DENSITY = 0.1
+SPARSE_MIN_CELLS = 100
+
+
+def new_matrix(n_rows, n_cols, rows, matrix_type=Matrix, sparse_density=None):
+    # Count the non-zero cells of the matrix to choose how to store it, unless sparse storage is off (None).
+    cells = n_rows * n_cols
+    if sparse_density is not None and cells >= SPARSE_MIN_CELLS:
+        nonzero = sum([1 for row in rows for v in row if float(v) != 0.0])
+        if nonzero <= sparse_density * cells:
+            return SparseMatrix(n_rows, n_cols, rows)
+    return matrix_type(n_rows, n_cols, rows)
+
+
+def read_matrix(ordinal='', matrix_type=Matrix, sparse_density=None):
     print('Enter size of ', ordinal, 'matrix: ', sep='')
     rows, cols = [int(n) for n in input().split()]
 
@@ -157,7 +760,351 @@ def read_matrix(ordinal=''):
     lines = []
     for i in range(rows):
         lines.append(input().split())
-    return Matrix(rows, cols, lines)
+    return new_matrix(rows, cols, lines, matrix_type, sparse_density)
+
+
+# The header of a binary matrix file: a magic number, a format version, and the numbers of rows and columns, followed by
+# the cells row by row as little-endian float64 values.
+BINARY_HEADER = struct.Struct('<4sIQQ')
+BINARY_MAGIC = b'MTRX'
+BINARY_VERSION = 1
+
+# The number of rows read or written at a time by the streaming readers and writers.
+CHUNK_ROWS = 1024
+
+
+def to_float64(values):  # an array('d') of the specified values in little-endian byte order
+    data = array('d', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+
+def save_matrix(matrix, path):  # write a matrix to a binary file, a chunk of rows at a time
+    with open(path, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, matrix.n_rows, matrix.n_cols))
+        if isinstance(matrix, ArrayMatrix) and numpy is not None:
+            # Transposed matrices are views of their buffers, so write them through a contiguous copy of each chunk.
+            for start in range(0, matrix.n_rows, CHUNK_ROWS):
+                f.write(numpy.ascontiguousarray(matrix.data[start:start + CHUNK_ROWS], dtype='<f8').tobytes())
+        else:
+            for start in range(0, matrix.n_rows, CHUNK_ROWS):
+                chunk = array('d')
+                for r in range(start, min(start + CHUNK_ROWS, matrix.n_rows)):
+                    chunk.extend(matrix.get_row(r))
+                f.write(to_float64(chunk).tobytes())
+
+
+def load_matrix(path):  # read a binary matrix file as an ArrayMatrix, memory-mapping it rather than reading it
+    with open(path, 'rb') as f:
+        header = f.read(BINARY_HEADER.size)
+        if len(header) != BINARY_HEADER.size:
+            raise ValueError('{} is not a matrix file'.format(path))
+        magic, version, n_rows, n_cols = BINARY_HEADER.unpack(header)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError('{} is not a matrix file'.format(path))
+        if n_rows * n_cols == 0:
+            return ArrayMatrix(n_rows, n_cols, [[] for _ in range(n_rows)])
+
+        if numpy is not None:
+            # Pages of the file are only read when used, and the matrix's operations never write to its buffer, so a
+            # copy-on-write mapping never changes the file.
+            data = numpy.memmap(f, dtype='<f8', mode='c', offset=BINARY_HEADER.size, shape=(n_rows, n_cols))
+            return ArrayMatrix.from_data(n_rows, n_cols, data)
+
+        # Without NumPy, the mapped cells are copied into a single array('d'), once.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            end = BINARY_HEADER.size + 8 * n_rows * n_cols
+            if len(mapped) < end:
+                raise ValueError('{} is truncated'.format(path))
+            data = array('d')
+            data.frombytes(mapped[BINARY_HEADER.size:end])
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return ArrayMatrix.from_data(n_rows, n_cols, data)
+
+
+def read_matrix_text(f):  # read a matrix in the text format (its size, then its rows) from a file, line by line
+    n_rows, n_cols = [int(n) for n in f.readline().split()]
+    data = array('d')
+    for r in range(n_rows):
+        line = f.readline().split()
+        if len(line) != n_cols:
+            raise ValueError('Row {} of the matrix should have {} cells'.format(r + 1, n_cols))
+        data.extend(map(float, line))
+
+    # Parse the cells straight into one float64 buffer, rather than into a list for each row.
+    if numpy is not None:
+        data = numpy.frombuffer(data, dtype=numpy.float64).reshape(n_rows, n_cols)
+    return ArrayMatrix.from_data(n_rows, n_cols, data)
+
+
+def write_matrix_text(matrix, f):  # write a matrix in the text format to a file, a chunk of rows at a time
+    f.write('{} {}\n'.format(matrix.n_rows, matrix.n_cols))
+    for start in range(0, matrix.n_rows, CHUNK_ROWS):
+        f.writelines([' '.join([str(n) for n in matrix.get_row(r)]) + '\n'
+                      for r in range(start, min(start + CHUNK_ROWS, matrix.n_rows))])
+
+
+def open_matrix(path):  # read a matrix from a binary ('.bin') or text file
+    if path.endswith('.bin'):
+        return load_matrix(path)
+    with open(path) as f:
+        return read_matrix_text(f)
+
+
+def write_matrix(matrix, path):  # write a matrix to a binary ('.bin') or text file
+    if path.endswith('.bin'):
+        save_matrix(matrix, path)
+    else:
+        with open(path, 'w') as f:
+            write_matrix_text(matrix, f)
+
+
+def benchmark_mult(sizes, workers, block=BLOCK_SIZE):  # time the product algorithms on random square matrices
+    print('{:>6} {:>12} {:>12} {:>12}'.format('size', 'loop (s)', 'blocked (s)', 'parallel (s)'))
+    for n in sizes:
+        rows = [[(i * 7 + j * 13) % 17 - 8.0 for j in range(n)] for i in range(n)]
+        times = []
+        for n_workers in (0, 1, workers):
+            a = Matrix(n, n, rows)
+            start = perf_counter()
+            a.mult_matrix(Matrix(n, n, rows), n_workers, block)
+            times.append(perf_counter() - start)
+        print('{:>6} {:>12.3f} {:>12.3f} {:>12.3f}'.format(n, *times))
+
+
+# The sizes of the square matrices benchmarked by run_benchmarks, and the types of matrix it can benchmark. Cofactor
+# expansion takes factorial time, so it is only benchmarked up to a small size, and determinants are only checked
+# against their exact values up to a size where those are quick to calculate and still fit in a float.
+BENCHMARK_SIZES = (2, 4, 8, 16, 32, 64, 128, 256, 512)
+BENCHMARK_ENGINES = {'lists': Matrix, 'array': ArrayMatrix, 'sparse': SparseMatrix}
+COFACTOR_LIMIT = 8
+EXACT_DETERMINANT_LIMIT = 64
+
+# The largest error each benchmarked operation may have before the benchmark fails. Sums, products and transposes of
+# whole numbers must be exact, determinants are checked relative to their size, and inverses by how far their product
+# with the matrix is from the identity.
+BENCHMARK_TOLERANCES = {'add': 0.0, 'mult': 0.0, 'transpose': 0.0, 'determinant': 1e-9, 'cofactor': 1e-9,
+                        'inverse': 1e-9}
+
+
+def benchmark_rows(n, density, rng):  # a square matrix of small whole numbers, with the specified fraction non-zero
+    rows = [[rng.randint(-9, 9) if rng.random() < density else 0 for _ in range(n)] for _ in range(n)]
+    for i in range(n):
+        rows[i][i] = rng.choice([-9, 9])
+    return rows
+
+
+def exact_determinant(rows):  # the exact determinant of a matrix of whole numbers, by fraction-free elimination
+    a = [list(row) for row in rows]
+    n = len(a)
+    sign = 1
+    previous = 1
+    for k in range(n - 1):
+        if a[k][k] == 0:
+            swap = next((r for r in range(k + 1, n) if a[r][k] != 0), None)
+            if swap is None:
+                return 0
+            a[k], a[swap] = a[swap], a[k]
+            sign = -sign
+        for i in range(k + 1, n):
+            for j in range(k + 1, n):
+                a[i][j] = (a[i][j] * a[k][k] - a[i][k] * a[k][j]) // previous
+        previous = a[k][k]
+    return sign * a[n - 1][n - 1] if n > 0 else 1
+
+
+def exact_product(a, b):  # the exact product of two matrices of whole numbers
+    if numpy is not None:
+        return (numpy.array(a, dtype=numpy.int64) @ numpy.array(b, dtype=numpy.int64)).tolist()
+    cols = list(zip(*b))
+    return [[sum(map(operator.mul, row, col)) for col in cols] for row in a]
+
+
+def exact_transpose(rows, t_type):  # the exact transpose of a matrix along the specified line
+    if t_type == 'main':
+        return [list(col) for col in zip(*rows)]
+    elif t_type == 'side':
+        return [list(col)[::-1] for col in zip(*rows)][::-1]
+    elif t_type == 'vertical':
+        return [row[::-1] for row in rows]
+    return rows[::-1]
+
+
+def max_error(matrix, reference):  # the largest difference between a matrix's cells and those of a reference matrix
+    return max([abs(v - r) for row, ref_row in zip(matrix.cells, reference) for v, r in zip(row, ref_row)],
+               default=0.0)
+
+
+def inverse_error(matrix, inverse):  # the largest difference between the product of a matrix and its inverse and I
+    product = ArrayMatrix.of(matrix).copy()
+    product.mult_matrix(inverse)
+    return max([abs(v - (1.0 if i == j else 0.0)) for i, row in enumerate(product.cells) for j, v in enumerate(row)],
+               default=0.0)
+
+
+# Runs an operation on fresh copies of a matrix, made by the specified function, and returns the best time of the
+# specified number of runs, the peak memory allocated by another (traced) run, and the value returned by the operation
+# along with the matrix it was run on.
+def measure_operation(make, operation, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        matrix = make()
+        start = perf_counter()
+        operation(matrix)
+        best = min(best, perf_counter() - start)
+
+    matrix = make()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    value = operation(matrix)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': best, 'bytes': peak}, value, matrix
+
+
+# Times each operation of each specified type of matrix on random square matrices of each specified size, and checks its
+# result against a reference calculated exactly (or, for inverses, how close the product with the matrix is to the
+# identity). Sparse matrices are benchmarked on matrices with 5% of their cells non-zero, and the others on dense ones.
+# Returns a list of mappings of the engine, operation, size, best time, peak memory and largest error of each benchmark.
+def run_benchmarks(sizes=BENCHMARK_SIZES, engines=tuple(BENCHMARK_ENGINES), repeat=3, seed=0):
+    results = []
+    for n in sizes:
+        # Large operations take long enough to time in a single run.
+        runs = repeat if n <= 64 else 1
+        for engine in engines:
+            matrix_type = BENCHMARK_ENGINES[engine]
+            rng = random.Random(seed)
+            a = benchmark_rows(n, 0.05 if engine == 'sparse' else 1.0, rng)
+            b = benchmark_rows(n, 0.05 if engine == 'sparse' else 1.0, rng)
+            other = matrix_type(n, n, b)
+
+            def make():
+                return matrix_type(n, n, a)
+
+            def record(operation, measurement, error):
+                measurement.update({'engine': engine, 'operation': operation, 'size': n, 'error': error})
+                results.append(measurement)
+
+            measurement, value, matrix = measure_operation(make, lambda m: m.add_matrix(other), runs)
+            record('add', measurement, max_error(matrix, [[x + y for x, y in zip(r, s)] for r, s in zip(a, b)]))
+            measurement, value, matrix = measure_operation(make, lambda m: m.mult_matrix(other), runs)
+            record('mult', measurement, max_error(matrix, exact_product(a, b)))
+            for t_type in ('main', 'side', 'vertical', 'horizontal'):
+                measurement, value, matrix = measure_operation(make, lambda m: m.transpose(t_type), runs)
+                record('transpose-' + t_type, measurement, max_error(matrix, exact_transpose(a, t_type)))
+
+            # Determinants are checked relative to their size.
+            exact = exact_determinant(a) if n <= EXACT_DETERMINANT_LIMIT else None
+            measurement, value, matrix = measure_operation(make, lambda m: m.determinant(), runs)
+            record('determinant', measurement, None if exact is None else abs(value - exact) / max(1, abs(exact)))
+            if n <= COFACTOR_LIMIT:
+                measurement, value, matrix = measure_operation(make, lambda m: calc_determinant(m.cells), runs)
+                record('cofactor', measurement, None if exact is None else abs(value - exact) / max(1, abs(exact)))
+
+            measurement, value, matrix = measure_operation(make, lambda m: m.inverse(), runs)
+            record('inverse', measurement, inverse_error(make(), matrix) if value else None)
+    return results
+
+
+def check_benchmarks(results, tolerances=BENCHMARK_TOLERANCES):  # describe every result less accurate than allowed
+    failures = []
+    for r in results:
+        tolerance = tolerances[r['operation'].split('-')[0]]
+        if r['error'] is not None and not r['error'] <= tolerance:
+            failures.append('{} {} {}: error {:.2e} > {:.2e}'.format(r['engine'], r['operation'], r['size'],
+                                                                     r['error'], tolerance))
+    return failures
+
+
+def print_benchmarks(results):  # print benchmark results as a table
+    print('{:<8} {:<22} {:>5} {:>12} {:>12} {:>10}'.format('engine', 'operation', 'size', 'seconds', 'peak KiB',
+                                                           'error'))
+    for r in results:
+        error = '-' if r['error'] is None else '{:.2e}'.format(r['error'])
+        print('{:<8} {:<22} {:>5} {:>12.6f} {:>12.1f} {:>10}'.format(r['engine'], r['operation'], r['size'],
+                                                                     r['seconds'], r['bytes'] / 1024, error))
+
+
+# Runs scripts of matrix operations over named matrices. The matrices are kept in memory between lines, so results are
+# reused by later operations rather than entered again, and operations never change their operands. Each line of a
+# script is either 'NAME = OPERATION ARGUMENTS...', which stores the resulting matrix as NAME, or one of 'print NAME',
+# 'det NAME' and 'save NAME PATH'. Blank lines and lines starting with '#' are skipped.
+class Pipeline:
+    # The operations which result in a new matrix, and the number of arguments each takes.
+    operations = {'load': 1, 'copy': 1, 'add': 2, 'scale': 2, 'mul': 2, 'transpose': 2, 'inverse': 1, 'solve': 2}
+
+    def __init__(self, out=sys.stdout, workers=0, block=BLOCK_SIZE):
+        self.out = out
+        self.workers = workers
+        self.block = block
+        self.matrices = {}
+
+    # Runs each line of a script in turn. Stops at the first line that fails, raising a ValueError or OSError with its
+    # line number, as the lines after it may depend on it.
+    def run(self, lines):
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if len(line) == 0 or line[0] == '#':
+                continue
+            try:
+                self.execute(line.split())
+            except (ValueError, OSError) as e:
+                raise type(e)('line {}: {}'.format(number, e))
+
+    def execute(self, words):
+        if len(words) >= 3 and words[1] == '=':
+            self.matrices[words[0]] = self.evaluate(words[2], words[3:])
+        elif words[0] == 'print' and len(words) == 2:
+            write_matrix_text(self.get(words[1]), self.out)
+        elif words[0] == 'det' and len(words) == 2:
+            self.out.write('{}\n'.format(self.get(words[1]).determinant()))
+        elif words[0] == 'save' and len(words) == 3:
+            write_matrix(self.get(words[1]), words[2])
+        else:
+            raise ValueError('Invalid line')
+
+    def get(self, name):  # the matrix with the specified name
+        if name not in self.matrices:
+            raise ValueError('Unknown matrix {}'.format(name))
+        return self.matrices[name]
+
+    def evaluate(self, operation, args):  # the matrix resulting from an operation
+        if operation not in self.operations:
+            raise ValueError('Unknown operation {}'.format(operation))
+        if len(args) != self.operations[operation]:
+            raise ValueError('{} takes {} arguments'.format(operation, self.operations[operation]))
+
+        if operation == 'load':
+            return open_matrix(args[0])
+        elif operation == 'scale':
+            matrix = self.get(args[0]).copy()
+            matrix.mult_scalar(float(args[1]))
+            return matrix
+        elif operation == 'solve':
+            x = self.get(args[0]).solve(self.get(args[1]))
+            if x is None:
+                raise ValueError('The system cannot be solved.')
+            return x
+
+        # The remaining operations change a copy of their first operand in place.
+        matrix = self.get(args[0]).copy()
+        if operation == 'add':
+            done = matrix.add_matrix(self.get(args[1]))
+        elif operation == 'mul':
+            done = matrix.mult_matrix(self.get(args[1]), self.workers, self.block)
+        elif operation == 'transpose':
+            done = matrix.transpose(args[1])
+        elif operation == 'inverse':
+            if not matrix.inverse():
+                raise ValueError("This matrix doesn't have an inverse.")
+            done = True
+        else:
+            done = True
+        if not done:
+            raise ValueError('The operation cannot be performed.')
+        return matrix
 
 
 def result(out):
@@ -167,7 +1114,11 @@ def result(out):
 
 # A Finite State Machine which stores the program's current state and handles its transition between states.
 class MenuFSM:
-    def __init__(self):
+    def __init__(self, matrix_type=Matrix, sparse_density=None, workers=0, block=BLOCK_SIZE):
+        self.matrix_type = matrix_type
+        self.sparse_density = sparse_density
+        self.workers = workers
+        self.block = block
         self.state = 'init'
         self.set_state('await_command')
 
@@ -189,34 +1140,37 @@ class MenuFSM:
                   'Your choice: ')
         self.state = state
 
+    def read(self, ordinal=''):  # read a matrix, stored as the menu's type of matrix unless it is sparse
+        return read_matrix(ordinal, self.matrix_type, self.sparse_density)
+
     def command(self, cmd):
         if self.state == 'await_command':
             if cmd == '1':
-                m1 = read_matrix('first ')
-                m2 = read_matrix('second ')
+                m1 = self.read('first ')
+                m2 = self.read('second ')
                 if m1.add_matrix(m2):
                     result(m1)
                 else:
                     print('The operation cannot be performed.')
             elif cmd == '2':
-                mat = read_matrix()
+                mat = self.read()
                 print('Enter constant: ')
                 mat.mult_scalar(float(input()))
                 result(mat)
             elif cmd == '3':
-                m1 = read_matrix('first ')
-                m2 = read_matrix('second ')
-                if m1.mult_matrix(m2):
+                m1 = self.read('first ')
+                m2 = self.read('second ')
+                if m1.mult_matrix(m2, self.workers, self.block):
                     result(m1)
                 else:
                     print('The operation cannot be performed.')
             elif cmd == '4':
                 self.set_state('await_option_transpose')
             elif cmd == '5':
-                mat = read_matrix()
+                mat = self.read()
                 result(mat.determinant())
             elif cmd == '6':
-                mat = read_matrix()
+                mat = self.read()
                 if mat.inverse():
                     result(mat)
                 else:
@@ -236,7 +1190,7 @@ class MenuFSM:
                 self.set_state('exit')
                 return
 
-            mat = read_matrix()
+            mat = self.read()
             mat.transpose(along)
             result(mat)
             self.set_state('await_command')
@@ -244,7 +1198,63 @@ class MenuFSM:
             self.set_state('exit')
 
 
-# The main program loop which iterates until the MenuFSM has a state of 'exit'.
-menu = MenuFSM()
-while menu.state != 'exit':
-    menu.command(input())
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Numeric Matrix Processor')
+    arg_parser.add_argument('--storage', choices=('lists', 'array'), default='lists',
+                            help='store matrices as lists of rows or in contiguous float64 arrays (default: lists)')
+    arg_parser.add_argument('--sparse-density', type=float, nargs='?', const=SPARSE_DENSITY, metavar='DENSITY',
+                            help='store matrices with at most this fraction of non-zero cells as sparse matrices, '
+                                 'which print zeros as 0.0 rather than -0.0 (default: off, {} if DENSITY is omitted, '
+                                 '0 to only store all-zero matrices as sparse)'.format(SPARSE_DENSITY))
+    arg_parser.add_argument('--convert', nargs=2, metavar=('SOURCE', 'DEST'),
+                            help="convert a matrix file between the text and binary ('.bin') formats and exit")
+    arg_parser.add_argument('--workers', type=int, default=0,
+                            help='multiply matrices a tile at a time with this many processes (default: 0, not tiled)')
+    arg_parser.add_argument('--block', type=int, default=BLOCK_SIZE,
+                            help='rows and columns of the tiles of tiled products (default: %(default)s)')
+    arg_parser.add_argument('--benchmark-mult', type=int, nargs='+', metavar='SIZE',
+                            help='time products of SIZE x SIZE matrices with each algorithm and exit')
+    arg_parser.add_argument('--pipeline', metavar='SCRIPT',
+                            help="run a script of matrix operations ('-' for standard input) and exit")
+    arg_parser.add_argument('--benchmark', type=int, nargs='*', metavar='SIZE',
+                            help='time and check every operation on SIZE x SIZE matrices (default: 2 to 512) and exit, '
+                                 'with status 1 if any result is less accurate than allowed')
+    arg_parser.add_argument('--engines', nargs='+', choices=tuple(BENCHMARK_ENGINES), default=tuple(BENCHMARK_ENGINES),
+                            help='types of matrix to benchmark (default: all)')
+    arg_parser.add_argument('--json', metavar='FILE', help='also write the benchmark results to FILE as JSON')
+    args = arg_parser.parse_args()
+
+    if args.benchmark is not None:
+        results = run_benchmarks(args.benchmark or BENCHMARK_SIZES, args.engines)
+        print_benchmarks(results)
+        if args.json is not None:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+
+        failures = check_benchmarks(results)
+        for failure in failures:
+            print('Inaccurate:', failure)
+        sys.exit(1 if len(failures) > 0 else 0)
+
+    if args.pipeline is not None:
+        pipeline = Pipeline(sys.stdout, args.workers, args.block)
+        script = sys.stdin if args.pipeline == '-' else open(args.pipeline)
+        with script:
+            try:
+                pipeline.run(script)
+            except (ValueError, OSError) as e:
+                sys.exit(str(e))
+        sys.exit()
+
+    if args.benchmark_mult is not None:
+        benchmark_mult(args.benchmark_mult, max(args.workers, 2), args.block)
+        sys.exit()
+
+    if args.convert is not None:
+        write_matrix(open_matrix(args.convert[0]), args.convert[1])
+        sys.exit()
+
+    # The main program loop which iterates until the MenuFSM has a state of 'exit'.
+    menu = MenuFSM(ArrayMatrix if args.storage == 'array' else Matrix, args.sparse_density, args.workers, args.block)
+    while menu.state != 'exit':
+        menu.command(input())